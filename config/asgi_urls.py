@@ -0,0 +1,11 @@
+"""
+URLconf used under ASGI: the news read routes are answered by
+news.async_views, everything else is config.urls unchanged.
+"""
+from django.urls import path, include
+
+from news.urls import async_urlpatterns
+from .urls import urlpatterns as sync_urlpatterns
+
+# Listed first so the async routes shadow their sync twins under api/.
+urlpatterns = [path('api/', include(async_urlpatterns))] + sync_urlpatterns
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,7 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'news.instrumentation.InstrumentationMiddleware',
+    'news.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'news.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +59,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+# Serve news reads through the async views; config.asgi switches this on.
+NEWS_ASYNC_READS = os.environ.get('NEWS_ASYNC_READS') == '1'
+
+ROOT_URLCONF = 'config.asgi_urls' if NEWS_ASYNC_READS else 'config.urls'
 
 TEMPLATES = [
     {
@@ -78,13 +85,142 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# NEWS_DB_PROFILE picks the database:
+# - 'sqlite' (default): a single-node file database. news.signals.tune_sqlite
+#   applies NEWS_SQLITE_PRAGMAS to every new connection. WAL lets readers
+#   run while a comment is being written. IMMEDIATE transactions take the
+#   write lock up front instead of failing on upgrade.
+# - 'postgres': POSTGRES_* from the environment, with persistent, health-checked
+#   connections. NEWS_DB_POOL=django uses Django's psycopg pool instead.
+#   NEWS_DB_POOL=pgbouncer is for PgBouncer in transaction mode, which cannot
+#   hold server-side cursors across transactions.
+NEWS_DB_PROFILE = os.environ.get('NEWS_DB_PROFILE', 'sqlite')
+NEWS_DB_POOL = os.environ.get('NEWS_DB_POOL', '')
+
+if NEWS_DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'news'),
+            'USER': os.environ.get('POSTGRES_USER', 'news'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
+    # Comma-separated replica hosts, each added as replica_<n> with the primary's credentials.
+    for number, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), 1):
+        DATABASES[f'replica_{number}'] = {
+            **DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'},
+        }
+    if NEWS_DB_POOL == 'django':
+        # The pool owns connection reuse; Django refuses persistent connections with it.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX', '10')),
+        }
+    elif NEWS_DB_POOL == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+    # A second file standing in for a replica locally; `manage.py sync_replica` refreshes it.
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            **DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH'], 'TEST': {'MIRROR': 'default'},
+        }
+
+# Safe-method requests read from these aliases (news.replicas): every
+# DATABASES entry but default. Clients that wrote within
+# NEWS_REPLICA_STICKY_SECONDS, and replicas more than NEWS_REPLICA_MAX_LAG
+# seconds behind (checked every NEWS_REPLICA_CHECK_INTERVAL), use the primary.
+DATABASE_ROUTERS = ['news.replicas.ReplicaRouter']
+NEWS_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+NEWS_REPLICA_STICKY_SECONDS = 10
+NEWS_REPLICA_STICKY_COOKIE = 'news_primary'
+NEWS_REPLICA_MAX_LAG = 5
+NEWS_REPLICA_CHECK_INTERVAL = 5
+
+NEWS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable at each checkpoint rather than each commit; safe with WAL.
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'responses' holds rendered news list/detail bodies and their generation
+# counters. LocMemCache is per-process LRU; point it at a shared backend
+# (Redis, Memcached) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'news-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
 }
 
+NEWS_RESPONSE_CACHE = 'responses'
+# Serve the precompressed /api/reference/ bodies to clients accepting them.
+NEWS_REFERENCE_PRECOMPRESS = True
+# Response compression (news.compression): codings in server preference
+# order (br and zstd need brotli / zstandard installed) and the smallest
+# body worth compressing.
+NEWS_COMPRESSION_ENCODINGS = ('zstd', 'br', 'gzip')
+NEWS_COMPRESSION_MIN_SIZE = 1024
+# /api/schema/ is generated once per code version (news.schema). Set
+# NEWS_CODE_VERSION at deploy (e.g. the commit) to skip hashing the sources;
+# `manage.py generate_schema` writes the artifacts to NEWS_SCHEMA_DIR.
+NEWS_CODE_VERSION = os.environ.get('NEWS_CODE_VERSION', '')
+NEWS_SCHEMA_DIR = os.environ.get('NEWS_SCHEMA_DIR', BASE_DIR / 'build' / 'schema')
+# /api/news/live/ (news.live): a redis:// URL shares events between worker
+# processes ('' keeps them in-process), the number of recent events kept for
+# Last-Event-ID resume, per-subscriber queue length and heartbeat seconds.
+NEWS_LIVE_BROKER = os.environ.get('NEWS_LIVE_BROKER', '')
+NEWS_LIVE_BUFFER_SIZE = 1000
+NEWS_LIVE_QUEUE_SIZE = 100
+NEWS_LIVE_HEARTBEAT = 15
+NEWS_LIVE_RETRY_MS = 3000
+# Rows fetched per round trip by /api/news/export/.
+NEWS_EXPORT_CHUNK_SIZE = 2000
+# Largest batch accepted by POST /api/news/bulk/.
+NEWS_BULK_MAX_ITEMS = 1000
+
+
+# Request instrumentation (news.instrumentation). Every request feeds the
+# per-route histograms on /api/metrics/, which needs the token or, without
+# one, a staff user. This fraction of requests is also profiled: query
+# histograms and the Server-Timing header. Requests over NEWS_SLOW_REQUEST_MS
+# (None disables) are logged with their SQL whether sampled or not.
+NEWS_METRICS = True
+NEWS_METRICS_TOKEN = os.environ.get('NEWS_METRICS_TOKEN')
+NEWS_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('NEWS_INSTRUMENTATION_SAMPLE_RATE', '0'))
+NEWS_SLOW_REQUEST_MS = 500
+NEWS_SLOW_LOG_MAX_QUERIES = 50
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -141,6 +277,10 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Dotted path to a news.search backend class; None picks one for the DB vendor
+# (FTS5 on SQLite, tsvector/GIN on Postgres).
+NEWS_SEARCH_BACKEND = None
+
 SPECTACULAR_SETTINGS = {
     'SERVE_PERMISSIONS': ['rest_framework.permissions.AllowAny'],
 }
@@ -152,9 +292,30 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': True,
 }
 
+# In-process cache of authenticated users keyed by access token
+# (news.authentication.user_cache). Saving or deleting a user evicts it here;
+# other workers pick the change up within the TTL (seconds).
+NEWS_AUTH_CACHE_SIZE = 10000
+NEWS_AUTH_CACHE_TTL = 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Who writes media bytes (news.media.serve): 'django' streams the file via
+# FileResponse (sendfile-capable WSGI servers send it zero-copy),
+# 'x-accel-redirect' hands off to nginx through an internal location at
+# NEWS_MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT, 'x-sendfile' to Apache/lighttpd.
+NEWS_MEDIA_SERVE_MODE = 'django'
+NEWS_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Responsive derivatives of News.image (news.images). Rendered by a
+# background thread pool after upload when NEWS_IMAGE_EAGER is on, otherwise
+# on first request to /media/derived/...
+NEWS_IMAGE_WIDTHS = (320, 640, 1024)
+NEWS_IMAGE_FORMATS = ('avif', 'webp', 'jpg')
+NEWS_IMAGE_EAGER = True
+NEWS_IMAGE_WORKERS = 2
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173', 
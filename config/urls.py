@@ -1,11 +1,16 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from news.media import serve as serve_media
+from news.views import derived_image
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('news.urls')),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}derived/<str:prefix>/<str:digest>/<int:width>w.<str:ext>",
+        derived_image,
+        name='derived-image',
+    ),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", serve_media, name='media'),
 ]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
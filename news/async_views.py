@@ -0,0 +1,105 @@
+"""
+Async read path for the news feed.
+
+Served through ``config.asgi_urls`` (``NEWS_ASYNC_READS``, switched on by
+``config.asgi``). GET/HEAD requests for the news list, a news detail and a
+comment thread are answered by coroutines on the viewset (``alist``,
+``aretrieve``, ``acomments``) that fetch through the async ORM and serialize
+rows that are already loaded. No worker thread is held for the request;
+Django still runs each SQL statement on its sync thread.
+
+Anything the async handlers do not cover falls back to the regular DRF view
+in a thread, so responses are the same either way:
+
+- writes and other non-GET methods;
+- non-JSON renderers (the browsable API queries while rendering forms);
+- ``async_fallback_params``, e.g. filterset fields validated with a query;
+- errors and 404s, which DRF's exception handling formats.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+# Route name -> viewset coroutine answering GET/HEAD for it.
+ASYNC_READ_HANDLERS = {
+    'news-list': 'alist',
+    'news-detail': 'aretrieve',
+    'news-comments': 'acomments',
+}
+
+
+def prepare_view(callback, request, args, kwargs):
+    """
+    The viewset instance DRF's dispatch would build for ``request``, or None
+    when only the sync view can answer it. Authentication is left lazy: the
+    read endpoints are public and never look at the user.
+    """
+    view = callback.cls(**callback.initkwargs)
+    view.action_map = dict(callback.actions)
+    view.action_map.setdefault('head', view.action_map.get('get'))
+    view.args, view.kwargs = args, kwargs
+    view.format_kwarg = view.get_format_suffix(**kwargs)
+    view.request = drf_request = view.initialize_request(request, *args, **kwargs)
+    view.headers = view.default_response_headers
+    if any(param in drf_request.query_params for param in getattr(view, 'async_fallback_params', ())):
+        return None
+    try:
+        drf_request.accepted_renderer, drf_request.accepted_media_type = view.perform_content_negotiation(drf_request)
+        drf_request.version, drf_request.versioning_scheme = view.determine_version(drf_request, *args, **kwargs)
+        view.check_permissions(drf_request)
+        view.check_throttles(drf_request)
+    except APIException:
+        return None
+    if drf_request.accepted_renderer.format != 'json':
+        return None
+    return view
+
+
+def finalize(view, response):
+    """DRF's response finalization, rendered to a plain HttpResponse up front."""
+    response = view.finalize_response(view.request, response)
+    if isinstance(response, Response):
+        # A template response would be rendered by the handler in a thread.
+        response.render()
+        plain = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            plain[header] = value
+        response = plain
+    return response
+
+
+async def read(callback, handler_name, request, args, kwargs):
+    view = prepare_view(callback, request, args, kwargs)
+    if view is None:
+        return None
+    try:
+        response = await getattr(view, handler_name)()
+    except APIException:
+        return None
+    return finalize(view, response) if response is not None else None
+
+
+def async_read_view(callback, handler_name):
+    """Wrap a DRF view so GET/HEAD run ``handler_name`` asynchronously."""
+    fallback = sync_to_async(callback)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            response = await read(callback, handler_name, request, args, kwargs)
+            if response is not None:
+                return response
+        return await fallback(request, *args, **kwargs)
+    return csrf_exempt(view)
+
+
+def with_async_reads(patterns, handlers=ASYNC_READ_HANDLERS):
+    """``patterns`` with the routes named in ``handlers`` served by async_read_view."""
+    return [
+        URLPattern(pattern.pattern, async_read_view(pattern.callback, handlers[pattern.name]),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in handlers else pattern
+        for pattern in patterns
+    ]
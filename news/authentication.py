@@ -1,16 +1,105 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import exceptions
 from django.conf import settings
 
+
+class AuthenticatedUserCache:
+    """
+    Bounded, per-process LRU of raw access token -> (validated token, user).
+
+    Entries live for ``NEWS_AUTH_CACHE_TTL`` seconds at most and never past
+    the token's own expiry. Signals drop every entry of a user when that user
+    is saved or deleted; other processes converge within the TTL.
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._tokens_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'NEWS_AUTH_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'NEWS_AUTH_CACHE_TTL', 60)
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            expires, validated_token, user = entry
+            if expires <= time.monotonic():
+                self._discard(raw_token)
+                return None
+            self._entries.move_to_end(raw_token)
+        # Requests may mutate request.user; never hand out the shared instance.
+        return validated_token, copy.copy(user)
+
+    def set(self, raw_token, validated_token, user):
+        ttl = self.ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        exp = validated_token.payload.get('exp')
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._discard(raw_token)
+            self._entries[raw_token] = (time.monotonic() + ttl, validated_token, copy.copy(user))
+            self._tokens_by_user[user.pk].add(raw_token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for raw_token in list(self._tokens_by_user.get(user_id, ())):
+                self._discard(raw_token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _discard(self, raw_token):
+        entry = self._entries.pop(raw_token, None)
+        if entry is None:
+            return
+        user_id = entry[2].pk
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(raw_token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = AuthenticatedUserCache()
+
+
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
         cookie_name = getattr(settings, 'SIMPLE_JWT', {}).get('AUTH_COOKIE', 'access_token')
         raw_token = request.COOKIES.get(cookie_name)
         if not raw_token:
             return None  # No token found in cookies
+        cached = user_cache.get(raw_token)
+        if cached is not None:
+            validated_token, user = cached
+            return (user, validated_token)
         try:
             validated_token = self.get_validated_token(raw_token)
             user = self.get_user(validated_token)
+            user_cache.set(raw_token, validated_token, user)
             return (user, validated_token)
         except exceptions.AuthenticationFailed as e:
             raise exceptions.AuthenticationFailed('Invalid token in cookie') from e
@@ -0,0 +1,431 @@
+"""
+Endpoint benchmarks with query-count and latency budgets.
+
+Each scenario drives one endpoint through the Django test client and records
+latency percentiles, queries per request and response bytes. Results can be
+saved as a JSON baseline and later runs compared against it; ``check``
+returns every budget a run exceeds. Driven by ``manage.py benchmark``.
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import AsyncClient, Client, RequestFactory
+from rest_framework.renderers import JSONRenderer
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+
+from .cache import get_response_cache
+from .models import Category, Comment, District, News, User
+from .renderers import FastJSONRenderer
+from .serializers import NewsCompactSerializer, NewsSerializer
+from . import counters, live
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: str
+    method: str = 'get'
+    data: dict = field(default_factory=dict)
+    max_queries: int = 5
+    p95_ms: float = 250.0
+
+
+SCENARIOS = [
+    # Cold news lists read their ETag/Last-Modified aggregate before the page.
+    Scenario('news-list', '/api/news/', max_queries=2),
+    Scenario('news-list-page-100', '/api/news/?page_size=100', max_queries=2),
+    Scenario('news-list-compact', '/api/news/?view=compact&page_size=100', max_queries=2),
+    Scenario('news-list-fields', '/api/news/?fields=id,title&page_size=100', max_queries=2),
+    Scenario('news-search', '/api/news/?search=election', max_queries=2),
+    Scenario('news-search-prefix', '/api/news/?search=mar', max_queries=2),
+    # filterset_fields validates ?category= with a lookup of its own.
+    Scenario('news-filter-category', '/api/news/?category={category}', max_queries=3),
+    Scenario('news-filter-district', '/api/news/?district={district}', max_queries=2),
+    Scenario('news-filter-district-name', '/api/news/?area__district__name={district_name}', max_queries=2),
+    Scenario('news-ordering', '/api/news/?ordering=created_at', max_queries=2),
+    Scenario('news-detail', '/api/news/{news}/', max_queries=1),
+    Scenario('comments-by-news', '/api/comments/?news={news}', max_queries=1),
+    Scenario('news-comment-thread', '/api/news/{news}/comments/', max_queries=1),
+    Scenario('news-count', '/api/news/count/', max_queries=1),
+    Scenario('news-count-category', '/api/news/count/?category={category}', max_queries=1),
+    Scenario('comments-count-news', '/api/comments/count/?news={news}', max_queries=1),
+    Scenario('categories-count', '/api/categories/count/', max_queries=1),
+    Scenario('areas-count', '/api/areas/count/', max_queries=1),
+    # Clearing the response cache resets the generations, so each cold run rebuilds the bundle.
+    Scenario('reference', '/api/reference/', max_queries=3),
+    Scenario(
+        'login', '/api/auth/login/', method='post',
+        data={'username': 'user', 'password': 'userpass'},
+        max_queries=2, p95_ms=2000.0,
+    ),
+]
+
+
+# Read paths compared by the WSGI/ASGI load test.
+LOAD_PATHS = ['/api/news/', '/api/news/{news}/', '/api/news/{news}/comments/']
+
+
+@contextmanager
+def seeded_database(test_name=None, **seed_options):
+    """
+    A throwaway test database filled by ``seed_data``. ``test_name`` puts it
+    in that file instead of the backend default (in memory for SQLite, where
+    journal modes do not apply).
+    """
+    setup_test_environment(debug=False)
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    previous_test_name = test_settings.get('NAME')
+    if test_name:
+        test_settings['NAME'] = test_name
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        call_command('seed_data', stdout=StringIO(), **seed_options)
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = previous_test_name
+        teardown_test_environment()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def scenario_context():
+    """Ids substituted into scenario paths, taken from the seeded data."""
+    news = News.objects.order_by('-created_at', '-id').first()
+    return {
+        'news': news.pk if news else 0,
+        'category': Category.objects.order_by('id').values_list('id', flat=True).first() or 0,
+        'district': District.objects.order_by('id').values_list('id', flat=True).first() or 0,
+        'district_name': District.objects.order_by('id').values_list('name', flat=True).first() or '',
+    }
+
+
+def run_scenario(client, scenario, context, iterations=20, warm=False):
+    path = scenario.path.format(**context)
+    latencies, queries, sizes = [], [], []
+    for _ in range(iterations):
+        if not warm:
+            get_response_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            if scenario.method == 'post':
+                response = client.post(path, scenario.data, content_type='application/json')
+            else:
+                response = client.get(path)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: {path} returned {response.status_code}')
+        queries.append(len(ctx.captured_queries))
+        sizes.append(len(body))
+    return {
+        'path': path,
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'queries': max(queries),
+        'bytes': max(sizes),
+    }
+
+
+def run(scenarios=None, iterations=20, warm=False):
+    client = Client()
+    context = scenario_context()
+    return {
+        scenario.name: run_scenario(client, scenario, context, iterations, warm)
+        for scenario in scenarios or SCENARIOS
+    }
+
+
+def check(results, scenarios=None, baseline=None, tolerance=0.25, latency=True):
+    """
+    Budget violations as readable strings. Query counts must stay within the
+    scenario budget and never exceed the baseline; latency must stay within
+    the scenario budget and within ``tolerance`` of the baseline p95.
+    """
+    failures = []
+    baseline = baseline or {}
+    for scenario in scenarios or SCENARIOS:
+        result = results.get(scenario.name)
+        if result is None:
+            continue
+        previous = baseline.get(scenario.name, {})
+        if result['queries'] > scenario.max_queries:
+            failures.append(f"{scenario.name}: {result['queries']} queries > budget {scenario.max_queries}")
+        if 'queries' in previous and result['queries'] > previous['queries']:
+            failures.append(f"{scenario.name}: {result['queries']} queries > baseline {previous['queries']}")
+        if not latency:
+            continue
+        if result['p95_ms'] > scenario.p95_ms:
+            failures.append(f"{scenario.name}: p95 {result['p95_ms']}ms > budget {scenario.p95_ms}ms")
+        if 'p95_ms' in previous and result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            failures.append(
+                f"{scenario.name}: p95 {result['p95_ms']}ms > baseline {previous['p95_ms']}ms +{tolerance:.0%}"
+            )
+    return failures
+
+
+def load_baseline(path):
+    try:
+        with open(path) as file:
+            return json.load(file)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def save_results(path, results, meta):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+@contextmanager
+def response_cache_disabled():
+    caches = {**settings.CACHES, 'loadtest': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    with override_settings(CACHES=caches, NEWS_RESPONSE_CACHE='loadtest'):
+        yield
+
+
+def _wsgi_load(paths, requests, concurrency, delay):
+    local = threading.local()
+
+    def fetch(path):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        start = time.perf_counter()
+        response = local.client.get(path)
+        latency = (time.perf_counter() - start) * 1000
+        # A slow client keeps the worker thread busy while it reads.
+        time.sleep(delay)
+        return latency, response.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(fetch, (paths[i % len(paths)] for i in range(requests))))
+
+
+async def _asgi_load(paths, requests, concurrency, delay):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latency = (time.perf_counter() - start) * 1000
+            await asyncio.sleep(delay)
+            return latency, response.status_code
+
+    return await asyncio.gather(*(fetch(paths[i % len(paths)]) for i in range(requests)))
+
+
+def load_test(mode, requests=500, concurrency=50, client_delay_ms=0.0, paths=None):
+    """
+    Run ``requests`` GETs over ``paths`` with ``concurrency`` in flight, through
+    the WSGI stack (one thread per in-flight request) or the ASGI stack with
+    the async read views (a single event loop). ``client_delay_ms`` holds each
+    slot after the response, standing in for a slow client.
+    """
+    context = scenario_context()
+    paths = [path.format(**context) for path in paths or LOAD_PATHS]
+    delay = client_delay_ms / 1000
+    start = time.perf_counter()
+    if mode == 'asgi':
+        with override_settings(ROOT_URLCONF='config.asgi_urls'):
+            results = asyncio.run(_asgi_load(paths, requests, concurrency, delay))
+    else:
+        results = _wsgi_load(paths, requests, concurrency, delay)
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency, _ in results]
+    return {
+        'mode': mode,
+        'requests': requests,
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'errors': sum(1 for _, status in results if status >= 400),
+    }
+
+
+def contention_test(writers=4, readers=8, operations=200):
+    """
+    ``writers`` threads add comments through the ORM while ``readers`` threads
+    fetch the news list and comment threads, ``operations`` each. Reports
+    throughput and latency per side, and the writes that failed on a lock.
+    """
+    context = scenario_context()
+    news_ids = list(News.objects.values_list('id', flat=True)[:500])
+    user_ids = list(User.objects.values_list('id', flat=True)[:100])
+    paths = [path.format(**context) for path in LOAD_PATHS]
+
+    def write(worker):
+        timings = []
+        try:
+            for i in range(operations):
+                start = time.perf_counter()
+                try:
+                    Comment.objects.create(
+                        news_id=news_ids[(worker + i) % len(news_ids)],
+                        user_id=user_ids[(worker * operations + i) % len(user_ids)],
+                        content=f'Contention comment {worker}-{i}',
+                    )
+                    ok = True
+                except OperationalError:
+                    ok = False
+                timings.append(((time.perf_counter() - start) * 1000, ok))
+        finally:
+            connection.close()
+        return 'write', timings
+
+    def read(worker):
+        client, timings = Client(), []
+        try:
+            for i in range(operations):
+                start = time.perf_counter()
+                response = client.get(paths[(worker + i) % len(paths)])
+                timings.append(((time.perf_counter() - start) * 1000, response.status_code < 400))
+        finally:
+            connection.close()
+        return 'read', timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers + readers) as pool:
+        jobs = [pool.submit(write, n) for n in range(writers)] + [pool.submit(read, n) for n in range(readers)]
+        outcomes = [job.result() for job in jobs]
+    elapsed = time.perf_counter() - start
+
+    result = {'database': connection.vendor, 'seconds': round(elapsed, 3)}
+    for kind in ('write', 'read'):
+        timings = [timing for side, side_timings in outcomes if side == kind for timing in side_timings]
+        latencies = [latency for latency, _ in timings]
+        result[kind] = {
+            'operations': len(timings),
+            'per_second': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'errors': sum(1 for _, ok in timings if not ok),
+        }
+    return result
+
+
+def serializer_benchmark(rows=100, iterations=30, serializer_classes=(NewsSerializer, NewsCompactSerializer)):
+    """
+    Serialize and render the same loaded page of ``rows`` news with DRF's
+    field-by-field ``to_representation`` + ``JSONRenderer`` and with the
+    compiled plan + ``FastJSONRenderer``. Database time is excluded. Reports
+    p50 milliseconds per page for both, the speedup and whether the bytes match.
+    """
+    request = RequestFactory().get('/api/news/')
+    results = {}
+    for serializer_class in serializer_classes:
+        context = {'request': request}
+        queryset = serializer_class(context=context).setup_eager_loading(
+            News.objects.annotate(comment_count=counters.counter_subquery('comment.news')),
+        )
+        page = list(queryset.order_by('-created_at', '-id')[:rows])
+
+        def drf():
+            serializer = serializer_class(page, many=True, context=context)
+            serializer.child.compiled_representation = False
+            return JSONRenderer().render(serializer.data)
+
+        def compiled():
+            return FastJSONRenderer().render(serializer_class(page, many=True, context=context).data)
+
+        timings = {}
+        for name, render in (('drf', drf), ('compiled', compiled)):
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                body = render()
+                latencies.append((time.perf_counter() - start) * 1000)
+            timings[name] = (round(percentile(latencies, 0.50), 3), body)
+        results[serializer_class.__name__] = {
+            'rows': len(page),
+            'drf_ms': timings['drf'][0],
+            'compiled_ms': timings['compiled'][0],
+            'speedup': round(timings['drf'][0] / timings['compiled'][0], 2) if timings['compiled'][0] else 0.0,
+            'identical': timings['drf'][1] == timings['compiled'][1],
+        }
+    return results
+
+
+def live_fanout(subscribers=20000, events=20, categories=50):
+    """
+    Subscribe ``subscribers`` idle live-feed clients on one event loop, spread
+    over ``categories`` category filters with every tenth unfiltered, then
+    publish ``events`` from another thread as the signals do. Reports the
+    memory a subscriber takes in the hub, the p50/max milliseconds from
+    publish until every matching queue has the event, deliveries against
+    the expected count and loop wakeups per event.
+    """
+    hub = live.Hub(events)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        call_soon_threadsafe, wakeups = loop.call_soon_threadsafe, 0
+
+        def counting(callback, *args):
+            nonlocal wakeups
+            wakeups += 1
+            return call_soon_threadsafe(callback, *args)
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        clients = [live.Subscriber(i % categories + 1 if i % 10 else None, size=events) for i in range(subscribers)]
+        for client in clients:
+            hub.subscribe(client)
+        memory = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        loop.call_soon_threadsafe = counting
+        latencies, expected = [], 0
+        try:
+            for n in range(events):
+                category = n % categories + 1
+                expected += sum(1 for client in clients if client.key[0] in (None, category))
+                delivered = loop.create_future()
+
+                def publish():
+                    start = time.perf_counter()
+                    hub.dispatch(live.Event(n + 1, category, None, b''))
+                    # Queued behind the delivery, so it resolves once every queue has the event.
+                    call_soon_threadsafe(delivered.set_result, start)
+
+                threading.Thread(target=publish).start()
+                latencies.append((time.perf_counter() - await delivered) * 1000)
+        finally:
+            del loop.call_soon_threadsafe
+        return {
+            'subscribers': subscribers,
+            'subscriber_bytes': memory // subscribers,
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'max_ms': round(max(latencies), 3),
+            'delivered': sum(client.queue.qsize() for client in clients),
+            'expected': expected,
+            'wakeups_per_event': wakeups / events,
+        }
+
+    return asyncio.run(main())
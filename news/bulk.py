@@ -0,0 +1,208 @@
+"""
+Batched writes for ``POST /api/news/bulk/``.
+
+A batch is validated without a query per item: every referenced category
+and area id is resolved in one query, the rows to update or delete in
+another. Valid items are then written with ``bulk_create`` /
+``bulk_update`` in one transaction, and deletes with one
+``QuerySet.delete()`` whose per-row receivers are switched off. Those skip
+the model signals, so the counters, search index, response cache
+generations and live feed are maintained here.
+"""
+import json
+from collections import Counter as Tally
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, Value
+from django.utils import timezone
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+from . import counters, live
+from .cache import bump_generation
+from .models import Category, Area, News, Comment, Counter
+from .search import get_search_backend
+from .serializers import NewsBulkItemSerializer
+from .signals import batched_deletes
+
+
+class NDJSONParser(BaseParser):
+    """One JSON object per line; blank lines are skipped."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        items = []
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f'Line {number}: {exc}')
+        return items
+
+
+def max_items():
+    return getattr(settings, 'NEWS_BULK_MAX_ITEMS', 1000)
+
+
+def resolve_references(items):
+    """``({category ids}, {area id: district id})`` for the ids the batch mentions, in one query."""
+    category_ids, area_ids = set(), set()
+    for item in items:
+        if isinstance(item, dict):
+            category_ids.add(_as_int(item.get('category_id')))
+            area_ids.add(_as_int(item.get('area_id')))
+    category_ids.discard(None)
+    area_ids.discard(None)
+    if not category_ids and not area_ids:
+        return set(), {}
+    categories = Category.objects.filter(pk__in=category_ids).values_list(
+        'pk', Value(None, output_field=IntegerField()), Value('category'),
+    )
+    areas = Area.objects.filter(pk__in=area_ids).values_list('pk', 'district_id', Value('area'))
+    found_categories, found_areas = set(), {}
+    for pk, district_id, kind in categories.union(areas, all=True):
+        if kind == 'category':
+            found_categories.add(pk)
+        else:
+            found_areas[pk] = district_id
+    return found_categories, found_areas
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None and not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _operation(item):
+    return item.get('op') or ('update' if item.get('id') is not None else 'create')
+
+
+def bulk_write(items, atomic=False, batch_size=500):
+    """
+    Apply ``items`` and return one result per item, in order. With ``atomic``
+    nothing is written unless every item is valid.
+    """
+    if not isinstance(items, list):
+        raise ValidationError('Expected a list of items.')
+    if len(items) > max_items():
+        raise ValidationError(f'At most {max_items()} items per request.')
+
+    category_ids, area_districts = resolve_references(items)
+    targets = {
+        _as_int(item.get('id')) for item in items
+        if isinstance(item, dict) and _operation(item) in ('update', 'delete')
+    } - {None}
+    existing = {}
+    if targets:
+        existing = News.objects.filter(pk__in=targets).in_bulk()
+    context = {'category_ids': category_ids, 'area_ids': set(area_districts)}
+
+    results, creates, updates, deletes, seen = [], [], [], [], set()
+    for index, item in enumerate(items):
+        result = {'index': index}
+        results.append(result)
+        if not isinstance(item, dict):
+            result.update(status='invalid', errors={'non_field_errors': ['Expected an object.']})
+            continue
+        op, pk, errors = _operation(item), _as_int(item.get('id')), {}
+        if op not in ('create', 'update', 'delete'):
+            errors['op'] = ['Must be create, update or delete.']
+        if op != 'delete':
+            serializer = NewsBulkItemSerializer(data=item, partial=op == 'update', context=context)
+            if not serializer.is_valid():
+                errors.update(serializer.errors)
+        if op in ('update', 'delete'):
+            if pk in seen:
+                errors.setdefault('id', ['Duplicate id in batch.'])
+            elif pk not in existing:
+                errors.setdefault('id', [f'Invalid pk "{item.get("id")}" - object does not exist.'])
+            seen.add(pk)
+        if errors:
+            result.update(status='invalid', id=item.get('id'), errors=errors)
+        elif op == 'create':
+            data = {key: value for key, value in serializer.validated_data.items() if key not in ('id', 'op')}
+            creates.append((result, News(district_id=area_districts[data['area_id']], **data)))
+        elif op == 'update':
+            updates.append((result, existing[pk], serializer.validated_data))
+        else:
+            deletes.append((result, existing[pk]))
+
+    if atomic and any(result.get('status') == 'invalid' for result in results):
+        for result in results:
+            result.setdefault('status', 'skipped')
+        return results
+
+    with transaction.atomic():
+        _apply(creates, updates, deletes, area_districts, batch_size)
+    return results
+
+
+def _delete_news(news_ids, tally):
+    """
+    Delete the news and, through their cascades, their comments without a
+    query per row: the per-row ``post_delete`` receivers are switched off
+    and what they maintain is done here for the whole batch.
+    """
+    with batched_deletes():
+        _, deleted = News.objects.filter(pk__in=news_ids).delete()
+    removed = deleted.get(Comment._meta.label, 0)
+    if removed:
+        tally['comment', 0] -= removed
+        tally[counters.COMMENT_REVISION, 0] += 1
+    Counter.objects.filter(name='comment.news', key__in=news_ids).delete()
+    get_search_backend().remove_many(news_ids)
+
+
+def _apply(creates, updates, deletes, area_districts, batch_size):
+    tally = Tally()
+    News.objects.bulk_create([news for _, news in creates], batch_size=batch_size)
+    for result, news in creates:
+        result.update(status='created', id=news.pk)
+        for key in counters.news_counter_keys(news.category_id, news.area_id, news.district_id):
+            tally[key] += 1
+
+    fields, now = {'updated_at'}, timezone.now()
+    for result, news, data in updates:
+        before = counters.news_counter_keys(news.category_id, news.area_id, news.district_id)
+        for key, value in data.items():
+            if key not in ('id', 'op'):
+                setattr(news, key, value)
+                fields.add(key)
+        if 'area_id' in data:
+            news.district_id = area_districts[news.area_id]
+            fields.add('district_id')
+        news.updated_at = now
+        after = counters.news_counter_keys(news.category_id, news.area_id, news.district_id)
+        for key in before:
+            tally[key] -= 1
+        for key in after:
+            tally[key] += 1
+        result.update(status='updated', id=news.pk)
+    News.objects.bulk_update([news for _, news, _ in updates], sorted(fields), batch_size=batch_size)
+
+    deleted = [news.pk for _, news in deletes]
+    for result, news in deletes:
+        result.update(status='deleted', id=news.pk)
+        for key in counters.news_counter_keys(news.category_id, news.area_id, news.district_id):
+            tally[key] -= 1
+    if deleted:
+        _delete_news(deleted, tally)
+
+    for (name, key), delta in tally.items():
+        counters.increment(name, key, delta)
+    written = [news.pk for _, news in creates] + [news.pk for _, news, _ in updates]
+    if written:
+        get_search_backend().index_news_many(written)
+    if written or deleted:
+        names = ['news', *(f'news:{pk}' for pk in [news.pk for _, news, _ in updates] + deleted)]
+        transaction.on_commit(lambda: bump_generation(*names))
+    for _, news in creates:
+        live.publish_news(news, 'created')
+    for _, news, _ in updates:
+        live.publish_news(news, 'updated')
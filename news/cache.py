@@ -0,0 +1,306 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from . import counters, replicas
+from .compression import Precompressed
+
+# Generation names bumped by signals. Lists depend on every news row, a
+# detail only on its own row; both nest the reference models.
+REFERENCE_GENERATIONS = ('category', 'area', 'district')
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'NEWS_RESPONSE_CACHE', 'default')]
+
+
+def _generation_key(name):
+    return f'gen:{name}'
+
+
+def bump_generation(*names):
+    """
+    Invalidate every cached response built from the given generations.
+
+    Missing counters are seeded from the clock rather than 1 so an evicted
+    counter can never come back at a value an older entry was keyed with.
+    """
+    cache = get_response_cache()
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def get_generations(*names):
+    cache = get_response_cache()
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in values}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        values.update(cache.get_many(list(missing)))
+    return [values.get(key, 0) for key in keys]
+
+
+def view_generations(view):
+    """Generation names a news list or detail response depends on."""
+    if view.action == 'retrieve':
+        lookup = view.kwargs[view.lookup_url_kwarg or view.lookup_field]
+        try:
+            # Signals bump news:<pk>, so /news/01/ must share news:1.
+            lookup = int(lookup)
+        except (TypeError, ValueError):
+            pass
+        return (f'news:{lookup}', *REFERENCE_GENERATIONS)
+    return ('news', *REFERENCE_GENERATIONS)
+
+
+def normalize_query(query_params):
+    """Stable representation of query params: sorted keys, empty values dropped."""
+    items = []
+    for key in sorted(query_params):
+        items += [(key, value) for value in query_params.getlist(key) if value != '']
+    return urlencode(items)
+
+
+class ResponseCacheMixin:
+    """
+    Serves ``list``/``retrieve`` from rendered bytes stored in the response
+    cache. Keys embed generation counters so signals invalidate by bumping a
+    counter instead of hunting down keys; a hit never touches the ORM or the
+    serializer.
+
+    Entries also hold the compressed copies of their body (see
+    news.compression): the first request for a coding compresses and stores
+    it, later hits serve the stored bytes.
+
+    Responses read from a replica are served but not stored: the replica
+    may not have the write that bumped the current generation yet.
+    """
+    response_cache_timeout = DEFAULT_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    async def alist(self):
+        return await self.acached_response(super().alist)
+
+    async def aretrieve(self):
+        return await self.acached_response(super().aretrieve)
+
+    def get_response_cache_generations(self):
+        return view_generations(self)
+
+    def get_response_cache_key(self):
+        request = self.request
+        generations = get_generations(*self.get_response_cache_generations())
+        raw = '|'.join([
+            request.build_absolute_uri(request.path),
+            normalize_query(request.query_params),
+            request.accepted_media_type,
+            *map(str, generations),
+        ])
+        return f'response:{self.basename}:{self.action}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def cached_response(self, handler):
+        if self.request.accepted_renderer.format != 'json':
+            return handler()
+        key = self.get_response_cache_key()
+        return self.get_cached_response(key) or self.store_response(key, handler())
+
+    async def acached_response(self, handler):
+        """``cached_response`` for async handlers; None from the handler is passed through."""
+        if self.request.accepted_renderer.format != 'json':
+            return await handler()
+        key = self.get_response_cache_key()
+        response = self.get_cached_response(key)
+        if response is None:
+            response = await handler()
+            if response is not None:
+                response = self.store_response(key, response)
+        return response
+
+    def get_cached_response(self, key):
+        cached = get_response_cache().get(key)
+        if cached is None:
+            return None
+        status, content_type, content, validators, encoded = cached
+        etag, last_modified = validators
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified and parse_http_date_safe(last_modified),
+        )
+        if response is None:
+            response = HttpResponse(content, content_type=content_type, status=status)
+            response.precompressed = self.precompressed(key, cached, encoded)
+        for header, value in zip(('ETag', 'Last-Modified'), validators):
+            if value:
+                response[header] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def store_response(self, key, response):
+        if response.status_code == 200:
+            renderer = self.request.accepted_renderer
+            media_type = self.request.accepted_media_type
+            content_type = f'{media_type}; charset={renderer.charset}' if renderer.charset else media_type
+            content = renderer.render(response.data, media_type, self.get_renderer_context())
+            validators = (response.get('ETag'), response.get('Last-Modified'))
+            entry = (response.status_code, content_type, content, validators, {})
+            if replicas.reading_from_replica():
+                precompressed = Precompressed(content)
+            else:
+                get_response_cache().set(key, entry, self.response_cache_timeout)
+                precompressed = self.precompressed(key, entry, {})
+            rendered = HttpResponse(content, content_type=content_type, status=response.status_code)
+            rendered.precompressed = precompressed
+            for header, value in response.items():
+                rendered.setdefault(header, value)
+            response = rendered
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def precompressed(self, key, entry, encoded):
+        def store(encoded):
+            get_response_cache().set(key, (*entry[:4], dict(encoded)), self.response_cache_timeout)
+        return Precompressed(entry[2], encoded, on_add=store)
+
+
+class ConditionalGetMixin:
+    """
+    ETag validators for ``list`` and ``retrieve``, answered with 304 before
+    anything is serialized.
+
+    A detail is validated by its ``updated_at``; a list by the newest
+    ``updated_at`` and the row count of the filtered queryset, read in one
+    aggregate. Comment counts and nested reference names are not reflected
+    in ``updated_at``, so the ETag also folds in the comment and reference
+    revision counters (news.counters), read in the same query. Validators
+    come from the database only, so every worker and restart agrees on
+    them. There is no Last-Modified: a timestamp cannot show deletes,
+    comments or reference renames, so If-Modified-Since alone never gets
+    a 304.
+
+    ``alist``/``aretrieve`` do the same through the async ORM for
+    news.async_views.
+    """
+    last_modified_field = 'updated_at'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Sparse fieldsets may have narrowed the columns with .only().
+        field_names, defer = queryset.query.deferred_loading
+        if field_names and not defer:
+            queryset = queryset.only(*field_names, self.last_modified_field, *self.get_ordering_columns(queryset))
+        if self.action == 'retrieve':
+            queryset = queryset.annotate(**self.get_revisions())
+        return queryset
+
+    def get_ordering_columns(self, queryset):
+        """Columns the paginator reads from the last row to build its cursor."""
+        if self.action != 'list' or self.paginator is None or not hasattr(self.paginator, 'get_ordering'):
+            return []
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        columns = [field.lstrip('-') for field in ordering]
+        return [column for column in columns if column not in queryset.query.annotations]
+
+    def get_etag(self, *parts):
+        request = self.request
+        raw = '|'.join(map(str, [
+            request.path,
+            normalize_query(request.query_params),
+            request.accepted_media_type,
+            *parts,
+        ]))
+        return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+    def get_list_aggregates(self):
+        return {
+            'last_modified': Max(self.last_modified_field), 'count': Count('pk'),
+            **{field: Max(revision) for field, revision in self.get_revisions().items()},
+        }
+
+    @staticmethod
+    def get_revisions():
+        return {name.replace('.', '_'): counters.counter_value(name) for name in counters.REVISIONS}
+
+    def get_list_etag(self, state):
+        last_modified = state['last_modified']
+        return self.get_etag(
+            last_modified and last_modified.isoformat(), state['count'],
+            *(state[field] for field in self.get_revisions()),
+        )
+
+    def get_instance_etag(self, instance):
+        return self.get_etag(
+            getattr(instance, self.last_modified_field).isoformat(), getattr(instance, 'comment_count', None),
+            *(getattr(instance, field) for field in self.get_revisions()),
+        )
+
+    def not_modified(self, etag):
+        return get_conditional_response(self.request, etag=etag)
+
+    def add_etag(self, response, etag):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+    def list_response(self, queryset, page):
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(**self.get_list_aggregates())
+        etag = self.get_list_etag(state)
+        response = self.not_modified(etag)
+        if response is None:
+            response = self.list_response(queryset, self.paginate_queryset(queryset))
+        return self.add_etag(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_instance_etag(instance)
+        response = self.not_modified(etag) or Response(self.get_serializer(instance).data)
+        return self.add_etag(response, etag)
+
+    async def alist(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        state = await queryset.order_by().aaggregate(**self.get_list_aggregates())
+        etag = self.get_list_etag(state)
+        response = self.not_modified(etag)
+        if response is None:
+            page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+            if page is None:
+                queryset = [obj async for obj in queryset]
+            response = self.list_response(queryset, page)
+        return self.add_etag(response, etag)
+
+    async def aretrieve(self):
+        """None when the object is missing, so the sync view can answer the 404."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, ValueError, TypeError):
+            return None
+        self.check_object_permissions(self.request, instance)
+        etag = self.get_instance_etag(instance)
+        response = self.not_modified(etag) or Response(self.get_serializer(instance).data)
+        return self.add_etag(response, etag)
@@ -0,0 +1,218 @@
+"""
+Negotiated response compression.
+
+``CompressionMiddleware`` compresses GET/HEAD responses whose content type is
+text-like (JSON, NDJSON, CSV, the OpenAPI schema, ...) and whose body is at
+least ``NEWS_COMPRESSION_MIN_SIZE`` bytes. It uses the best coding from
+``Accept-Encoding`` among ``NEWS_COMPRESSION_ENCODINGS``. gzip is always
+available; br and zstd need the optional ``brotli`` / ``zstandard`` packages.
+Streaming responses are compressed chunk by chunk.
+
+A response can carry ``precompressed`` (a ``Precompressed``), in which case
+the middleware takes the body from it instead of compressing. The response
+cache and the reference bundle use this to keep compressed copies next to
+their bodies, so a cached body is compressed once per coding. Responses
+that already have a Content-Encoding are left alone.
+"""
+import gzip
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Event streams are left alone: a compressor per idle connection costs more than it saves.
+COMPRESSIBLE_TYPES = re.compile(r'^(text/(?!event-stream)|application/([\w.+-]*\+)?(json|x-ndjson|xml|javascript|yaml|vnd\.oai\.openapi))')
+
+_CODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# coding -> (whole-body compressor, streaming compressor, default level)
+CODECS = {'gzip': (lambda body, level: gzip.compress(body, compresslevel=level, mtime=0), _GzipStream, 6)}
+if brotli is not None:
+    CODECS['br'] = (lambda body, level: brotli.compress(body, quality=level), _BrotliStream, 5)
+if zstandard is not None:
+    CODECS['zstd'] = (lambda body, level: zstandard.ZstdCompressor(level=level).compress(body), _ZstdStream, 3)
+
+
+def available_encodings():
+    """Configured codings that can be produced here, in server preference order."""
+    return [coding for coding in getattr(settings, 'NEWS_COMPRESSION_ENCODINGS', ('zstd', 'br', 'gzip')) if coding in CODECS]
+
+
+def accepted_encodings(request):
+    """``{coding: q}`` from the request's Accept-Encoding."""
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = _CODING_RE.match(part)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                accepted[match.group(1).lower()] = 0.0
+    return accepted
+
+
+def accepts_encoding(request, coding):
+    """Whether the request's Accept-Encoding allows ``coding`` (q > 0)."""
+    accepted = accepted_encodings(request)
+    return accepted.get(coding, accepted.get('*', 0)) > 0
+
+
+def negotiate(request, codings=None):
+    """The coding to use for ``request`` out of ``codings``, or None for identity."""
+    accepted = accepted_encodings(request)
+    best, best_q = None, 0.0
+    for coding in available_encodings() if codings is None else codings:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, coding, level=None):
+    compressor, _, default_level = CODECS[coding]
+    return compressor(body, default_level if level is None else level)
+
+
+def compress_stream(chunks, coding):
+    compressor = CODECS[coding][1](CODECS[coding][2])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, coding):
+    compressor = CODECS[coding][1](CODECS[coding][2])
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Precompressed:
+    """
+    Compressed copies of one body, each made at most once. ``on_add`` is
+    called with all copies whenever a new one is made, so the owner can
+    persist them.
+    """
+    def __init__(self, body, encoded=None, on_add=None, level=None):
+        self.body = body
+        self.encoded = dict(encoded or {})
+        self.on_add = on_add
+        self.level = level
+
+    def get(self, coding):
+        if coding not in self.encoded:
+            self.encoded[coding] = compress(self.body, coding, self.level)
+            if self.on_add is not None:
+                self.on_add(self.encoded)
+        return self.encoded[coding]
+
+
+def min_size():
+    return getattr(settings, 'NEWS_COMPRESSION_MIN_SIZE', 1024)
+
+
+def should_compress(request, response):
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return False
+    if response.has_header('Content-Encoding'):
+        return False
+    return bool(COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')))
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not should_compress(request, response):
+            return response
+        if not response.streaming and len(response.content) < min_size():
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request)
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, coding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, coding)
+            del response['Content-Length']
+        else:
+            precompressed = getattr(response, 'precompressed', None)
+            body = precompressed.get(coding) if precompressed is not None else compress(response.content, coding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        # The compressed body is a different representation of the same resource.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
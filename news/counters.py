@@ -0,0 +1,91 @@
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Bumped by writes that change news representations without touching
+# News.updated_at, so HTTP validators can be built from the database alone.
+COMMENT_REVISION = 'revision.comment'
+REFERENCE_REVISION = 'revision.reference'
+REVISIONS = (COMMENT_REVISION, REFERENCE_REVISION)
+
+
+def _counter_model(apps):
+    return apps.get_model('news', 'Counter')
+
+
+def increment(name, key=0, delta=1, using='default', apps=global_apps):
+    if not delta or key is None:
+        return
+    Counter = _counter_model(apps)
+    counters = Counter.objects.using(using)
+    with transaction.atomic(using=using):
+        if counters.filter(name=name, key=key).update(value=F('value') + delta):
+            return
+        try:
+            with transaction.atomic(using=using):
+                counters.create(name=name, key=key, value=delta)
+        except IntegrityError:
+            # Another writer created the row first.
+            counters.filter(name=name, key=key).update(value=F('value') + delta)
+
+
+def get_count(name, key=0, using='default'):
+    value = _counter_model(global_apps).objects.using(using).filter(name=name, key=key).values_list('value', flat=True).first()
+    return value or 0
+
+
+def counter_subquery(name, outer_ref='pk'):
+    """Expression reading the counter keyed by the outer row, for ``annotate()``."""
+    Counter = _counter_model(global_apps)
+    value = Counter.objects.filter(name=name, key=OuterRef(outer_ref)).values('value')[:1]
+    return Coalesce(Subquery(value), Value(0))
+
+
+def counter_value(name, key=0):
+    """Expression reading one counter, for ``annotate()``; 0 when it does not exist yet."""
+    Counter = _counter_model(global_apps)
+    return Coalesce(Subquery(Counter.objects.filter(name=name, key=key).values('value')[:1]), Value(0))
+
+
+def news_counter_keys(category_id, area_id, district_id):
+    return [
+        ('news', 0),
+        ('news.category', category_id),
+        ('news.area', area_id),
+        ('news.district', district_id),
+    ]
+
+
+def rebuild(using='default', apps=global_apps):
+    """Recompute every counter from the tables, e.g. after bulk loads."""
+    Counter = _counter_model(apps)
+    Category = apps.get_model('news', 'Category')
+    Area = apps.get_model('news', 'Area')
+    News = apps.get_model('news', 'News')
+    Comment = apps.get_model('news', 'Comment')
+
+    rows = [
+        ('category', 0, Category.objects.using(using).count()),
+        ('area', 0, Area.objects.using(using).count()),
+        ('news', 0, News.objects.using(using).count()),
+        ('comment', 0, Comment.objects.using(using).count()),
+    ]
+    grouped = [
+        ('news.category', News, 'category_id'),
+        ('news.area', News, 'area_id'),
+        ('news.district', News, 'area__district_id'),
+        ('comment.news', Comment, 'news_id'),
+    ]
+    for name, model, field in grouped:
+        for key, value in model.objects.using(using).values_list(field).annotate(value=Count('pk')).order_by():
+            rows.append((name, key, value))
+
+    with transaction.atomic(using=using):
+        # Revisions only ever grow; they cannot be recomputed from the tables.
+        Counter.objects.using(using).exclude(name__in=REVISIONS).delete()
+        Counter.objects.using(using).bulk_create(
+            [Counter(name=name, key=key, value=value) for name, key, value in rows],
+            batch_size=500,
+        )
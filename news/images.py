@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'derived'
+
+# ext -> (Pillow format, save options, mime type)
+FORMATS = {
+    'avif': ('AVIF', {'quality': 60}, 'image/avif'),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}, 'image/webp'),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}, 'image/jpeg'),
+}
+
+
+def derivative_widths():
+    return tuple(getattr(settings, 'NEWS_IMAGE_WIDTHS', (320, 640, 1024)))
+
+
+def derivative_formats():
+    """Modern formats first so a ``<picture>`` can list sources in order."""
+    formats = getattr(settings, 'NEWS_IMAGE_FORMATS', ('avif', 'webp', 'jpg'))
+    return tuple(ext for ext in formats if ext in FORMATS and (ext == 'jpg' or features.check(ext)))
+
+
+def widths_for(source_width):
+    """Width buckets below the original, plus the original when it is smaller than the largest bucket."""
+    widths = [width for width in derivative_widths() if not source_width or width < source_width]
+    if source_width and source_width <= max(derivative_widths(), default=0):
+        widths.append(source_width)
+    return widths
+
+
+# derivative_path() output: the digest is the full sha256 of the source.
+DERIVED_PATH_RE = re.compile(rf'{DERIVED_DIR}/(?P<prefix>[0-9a-f]{{2}})/(?P=prefix)[0-9a-f]{{62}}/\d+w\.\w+')
+
+
+def derivative_path(digest, width, ext):
+    return f'{DERIVED_DIR}/{digest[:2]}/{digest}/{width}w.{ext}'
+
+
+def _hash_and_width(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width = image.width
+    file.seek(0)
+    return digest.hexdigest(), width
+
+
+def inspect_image(field_file):
+    """
+    ``(sha256 hex digest, width)`` of an image field's file, or ``('', None)``
+    when it cannot be read (e.g. seed rows pointing at external URLs).
+    """
+    if not field_file:
+        return '', None
+    try:
+        if field_file._committed:
+            with field_file.storage.open(field_file.name, 'rb') as file:
+                return _hash_and_width(file)
+        return _hash_and_width(field_file.file)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning('Could not read image %s', field_file.name)
+        return '', None
+
+
+def render_derivative(source, width, ext):
+    image_format, options, _ = FORMATS[ext]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        output = BytesIO()
+        image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+
+
+def store_derivative(path, content, storage=default_storage):
+    """
+    Write ``content`` at exactly ``path``. Derivatives are content-addressed,
+    so concurrent writers store the same bytes: on the filesystem the file is
+    written aside and renamed into place, elsewhere a suffixed duplicate left
+    by losing the race is deleted.
+    """
+    try:
+        target = storage.path(path)
+    except NotImplementedError:
+        name = storage.save(path, ContentFile(content))
+        if name != path:
+            storage.delete(name)
+        return
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=directory, prefix='.partial-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(partial, storage.file_permissions_mode or 0o644)
+        os.replace(partial, target)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+
+def generate_derivative(source_name, digest, width, ext, storage=default_storage):
+    """Render one derivative unless it is already stored; returns its storage path."""
+    path = derivative_path(digest, width, ext)
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(path, threading.Lock())
+    # One render per path in this process, whether from a request or the pool.
+    with lock:
+        try:
+            if not storage.exists(path):
+                with storage.open(source_name, 'rb') as source:
+                    store_derivative(path, render_derivative(source, width, ext), storage)
+        finally:
+            with _render_locks_lock:
+                _render_locks.pop(path, None)
+    return path
+
+
+def generate_derivatives(source_name, digest, source_width=None, storage=default_storage):
+    paths = []
+    for width in widths_for(source_width):
+        for ext in derivative_formats():
+            try:
+                paths.append(generate_derivative(source_name, digest, width, ext, storage))
+            except (OSError, ValueError):
+                logger.exception('Could not render %s at %sw as %s', source_name, width, ext)
+    return paths
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'NEWS_IMAGE_WORKERS', 2),
+                thread_name_prefix='news-images',
+            )
+        return _executor
+
+
+def schedule_derivatives(source_name, digest, source_width=None):
+    """Queue derivative rendering on the background pool."""
+    return get_executor().submit(generate_derivatives, source_name, digest, source_width)
+
+
+def build_srcset(digest, source_width, url_builder=None):
+    """``{ext: 'url 320w, url 640w'}`` for every derivative format; no storage I/O."""
+    if not digest:
+        return {}
+    url_builder = url_builder or (lambda url: url)
+    widths = widths_for(source_width)
+    return {
+        ext: ', '.join(
+            f'{url_builder(default_storage.url(derivative_path(digest, width, ext)))} {width}w'
+            for width in widths
+        )
+        for ext in derivative_formats()
+    }
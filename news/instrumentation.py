@@ -0,0 +1,254 @@
+"""
+Per-request instrumentation.
+
+``InstrumentationMiddleware`` records every request's latency in a per-route
+histogram (``metrics``, served as Prometheus text on ``/api/metrics/``).
+A sample of ``NEWS_INSTRUMENTATION_SAMPLE_RATE`` of the requests is also
+profiled:
+
+- each SQL statement is timed through an execute wrapper;
+- ``InstrumentedViewMixin`` times authentication, the view code outside SQL
+  (mostly serialization) and rendering;
+- the totals go out in a ``Server-Timing`` header.
+
+Requests slower than ``NEWS_SLOW_REQUEST_MS`` are logged to
+``news.slow_requests`` with their SQL. To have it, every request records its
+statements (up to ``NEWS_SLOW_LOG_MAX_QUERIES``) while the slow log is on;
+only sampled requests get the header and feed the query histograms. Set
+``NEWS_SLOW_REQUEST_MS = None`` and sampling off, and a request costs one clock
+read and one histogram update.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.response import SimpleTemplateResponse
+
+logger = logging.getLogger('news.slow_requests')
+
+_profile = ContextVar('news_request_profile', default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PHASES = ('auth', 'db', 'serialize', 'render')
+
+
+class RequestProfile:
+    def __init__(self, keep_sql, sampled=True):
+        self.sampled = sampled
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations['db'] += elapsed
+            self.queries += 1
+            if len(self.statements) < self.keep_sql:
+                self.statements.append((elapsed, sql, params))
+
+    def server_timing(self, total):
+        parts = [f'db;dur={self.durations["db"] * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f'{phase};dur={self.durations[phase] * 1000:.1f}' for phase in PHASES if phase != 'db']
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def timed(phase):
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(phase, time.perf_counter() - start)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Per-process request histograms keyed by (route, method)."""
+    def __init__(self):
+        self._latency = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, seconds, queries=None):
+        key = (route, method)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if queries is not None:
+                histogram = self._queries.get(key)
+                if histogram is None:
+                    histogram = self._queries[key] = Histogram(QUERY_BUCKETS)
+                histogram.observe(queries)
+
+    def clear(self):
+        with self._lock:
+            self._latency.clear()
+            self._queries.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._render(lines, 'news_request_duration_seconds', 'Request latency by route.', self._latency)
+            self._render(lines, 'news_request_queries', 'SQL queries per profiled request by route.', self._queries)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render(lines, name, help_text, histograms):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (route, method), histogram in sorted(histograms.items()):
+            labels = f'route="{_escape(route)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum:g}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        profile, stack, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(stack, token)
+        return self.finish(request, response, start, profile)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        profile, stack, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(stack, token)
+        return self.finish(request, response, start, profile)
+
+    def start(self, request):
+        rate = getattr(settings, 'NEWS_INSTRUMENTATION_SAMPLE_RATE', 0.0)
+        sampled = rate > 0 and (rate >= 1 or random.random() < rate)
+        if not sampled and getattr(settings, 'NEWS_SLOW_REQUEST_MS', None) is None:
+            return None, None, None
+        profile = RequestProfile(getattr(settings, 'NEWS_SLOW_LOG_MAX_QUERIES', 50), sampled)
+        stack = ExitStack()
+        for alias in settings.DATABASES:
+            stack.enter_context(connections[alias].execute_wrapper(profile.record_query))
+        return profile, stack, _profile.set(profile)
+
+    def stop(self, stack, token):
+        if stack is not None:
+            _profile.reset(token)
+            stack.close()
+
+    def finish(self, request, response, start, profile):
+        total = time.perf_counter() - start
+        route = _route(request)
+        sampled = profile is not None and profile.sampled
+        if getattr(settings, 'NEWS_METRICS', True):
+            metrics.observe(route, request.method, total, profile.queries if sampled else None)
+        if sampled:
+            response['Server-Timing'] = profile.server_timing(total)
+        slow_ms = getattr(settings, 'NEWS_SLOW_REQUEST_MS', None)
+        if slow_ms is not None and total * 1000 >= slow_ms:
+            log_slow_request(request, route, response, total, profile)
+        return response
+
+
+def log_slow_request(request, route, response, total, profile):
+    message = f'{request.method} {request.get_full_path()} ({route}) {response.status_code} took {total * 1000:.1f}ms'
+    if profile is None:
+        logger.warning(message + ' (not profiled)')
+        return
+    lines = [message + ' ' + profile.server_timing(total)]
+    lines += [f'  {elapsed * 1000:8.2f}ms  {sql}  {params!r}' for elapsed, sql, params in profile.statements]
+    if profile.queries > len(profile.statements):
+        lines.append(f'  ... {profile.queries - len(profile.statements)} more queries')
+    logger.warning('\n'.join(lines))
+
+
+class InstrumentedViewMixin:
+    """
+    Splits a profiled DRF request into auth (authenticators), serialize (the
+    handler's time outside SQL) and render (the renderer) for Server-Timing.
+    """
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        profile = _profile.get()
+        if profile is not None:
+            self._handler_started = (time.perf_counter(), profile.durations['db'])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = _profile.get()
+        started = getattr(self, '_handler_started', None)
+        if profile is not None and started is not None:
+            elapsed = time.perf_counter() - started[0]
+            profile.add('serialize', max(0.0, elapsed - (profile.durations['db'] - started[1])))
+            self._handler_started = None
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if profile is not None and isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+            render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: profile.add('render', time.perf_counter() - render_started)
+            )
+        return response
@@ -0,0 +1,261 @@
+"""
+Live feed of news writes over Server-Sent Events.
+
+``GET /api/news/live/?category=&district=`` (ASGI only) keeps the
+connection open and sends an event for every committed news create or
+update matching the filters. The news ``post_save`` signal and the bulk
+endpoint publish through a broker:
+
+- ``LocalBroker`` (default) hands events to this process's ``hub``;
+- ``RedisBroker`` (``NEWS_LIVE_BROKER = 'redis://...'``, needs ``redis``)
+  numbers them with INCR and relays them to every worker over pub/sub.
+
+The hub keeps the last ``NEWS_LIVE_BUFFER_SIZE`` events, so a reconnecting
+client resumes after its ``Last-Event-ID``. When that id is older than the
+buffer the client gets a ``reset`` event and should refetch /api/news/.
+
+Subscribers are asyncio queues indexed by their filters. An event reaches
+each event loop through a single ``call_soon_threadsafe``, so an idle
+subscriber costs one queue and one heartbeat timer. A subscriber whose
+queue fills up is disconnected; it then resumes from the buffer.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import NewsEventSerializer
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+Event = namedtuple('Event', ['id', 'category', 'district', 'frame'])
+
+
+def encode_frame(event_id, kind, data):
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, kind.encode(), data)
+
+
+def matches(key, event):
+    category, district = key
+    return category in (None, event.category) and district in (None, event.district)
+
+
+class Subscriber:
+    __slots__ = ('loop', 'queue', 'key', 'dropped')
+
+    def __init__(self, category=None, district=None, size=None):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size or getattr(settings, 'NEWS_LIVE_QUEUE_SIZE', 100))
+        self.key = (category, district)
+        self.dropped = False
+
+
+def _deliver(subscribers, event):
+    for subscriber in subscribers:
+        if subscriber.dropped:
+            continue
+        try:
+            subscriber.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscriber.dropped = True
+
+
+class Hub:
+    """This process's subscribers and a ring buffer of the latest events."""
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        # Events up to this id may have happened without being buffered here.
+        self.floor = 0
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers[subscriber.key].add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.key]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(map(len, self._subscribers.values()))
+
+    def dispatch(self, event):
+        """Buffer ``event`` and queue it for matching subscribers; callable from any thread."""
+        keys = {(None, None), (event.category, None), (None, event.district), (event.category, event.district)}
+        by_loop = defaultdict(list)
+        with self._lock:
+            if len(self.events) == self.events.maxlen:
+                self.floor = self.events[0].id
+            self.events.append(event)
+            for key in keys:
+                for subscriber in self._subscribers.get(key, ()):
+                    by_loop[subscriber.loop].append(subscriber)
+        for loop, subscribers in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, subscribers, event)
+            except RuntimeError:
+                # The loop is closed; its subscribers are gone with it.
+                pass
+
+    def replay(self, last_id, key):
+        """Buffered events after ``last_id`` matching ``key``, and whether none can be missing."""
+        with self._lock:
+            return [event for event in self.events if event.id > last_id and matches(key, event)], last_id >= self.floor
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self.floor = 0
+
+
+hub = Hub(getattr(settings, 'NEWS_LIVE_BUFFER_SIZE', 1000))
+
+
+class LocalBroker:
+    """
+    Single-process broker. Ids count up from the clock in microseconds, so
+    they keep increasing across restarts and older ids are known to be lost.
+    """
+    url = ''
+
+    def __init__(self, hub):
+        self.hub = hub
+        start = time.time_ns() // 1000
+        self._ids = itertools.count(start)
+        self._lock = threading.Lock()
+        hub.floor = max(hub.floor, start - 1)
+
+    def publish(self, kind, category, district, data):
+        with self._lock:
+            event_id = next(self._ids)
+            self.hub.dispatch(Event(event_id, category, district, encode_frame(event_id, kind, data)))
+
+    def listen(self):
+        pass
+
+
+class RedisBroker:
+    """Cross-process broker: ids from INCR, events relayed to every worker over pub/sub."""
+    def __init__(self, hub, url, channel='news:live'):
+        if redis is None:
+            raise ImproperlyConfigured('NEWS_LIVE_BROKER needs the redis package (pip install redis).')
+        self.hub, self.url, self.channel = hub, url, channel
+        self.client = redis.Redis.from_url(url)
+        self._relay = None
+        self._lock = threading.Lock()
+
+    def publish(self, kind, category, district, data):
+        event_id = self.client.incr(f'{self.channel}:seq')
+        self.client.publish(self.channel, json.dumps([event_id, kind, category, district, data.decode()]))
+
+    def listen(self):
+        """Start relaying the channel into the hub, once per process."""
+        with self._lock:
+            if self._relay is not None:
+                return
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            self.hub.floor = max(self.hub.floor, int(self.client.get(f'{self.channel}:seq') or 0))
+            self._relay = threading.Thread(target=self.relay, args=(pubsub,), name='news-live-relay', daemon=True)
+            self._relay.start()
+
+    def relay(self, pubsub):
+        while True:
+            try:
+                for message in pubsub.listen():
+                    event_id, kind, category, district, data = json.loads(message['data'])
+                    self.hub.dispatch(Event(event_id, category, district, encode_frame(event_id, kind, data.encode())))
+            except redis.ConnectionError:
+                # pubsub resubscribes when it reconnects; events published meanwhile are lost.
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    url = getattr(settings, 'NEWS_LIVE_BROKER', '')
+    broker = _broker
+    if broker is None or broker.url != url:
+        with _broker_lock:
+            if _broker is None or _broker.url != url:
+                _broker = RedisBroker(hub, url) if url else LocalBroker(hub)
+            broker = _broker
+    return broker
+
+
+def publish_news(news, kind, using=None):
+    """Publish ``news`` to live subscribers once the current transaction commits."""
+    data = JSONRenderer().render(NewsEventSerializer(news).data)
+    category, district = news.category_id, news.district_id
+    transaction.on_commit(lambda: get_broker().publish(kind, category, district, data), using=using)
+
+
+async def event_stream(category, district, last_id):
+    subscriber = Subscriber(category, district)
+    hub.subscribe(subscriber)
+    try:
+        yield b'retry: %d\n\n' % getattr(settings, 'NEWS_LIVE_RETRY_MS', 3000)
+        # Events queued while replaying are also in the replay; skip those.
+        seen = last_id
+        if last_id is not None:
+            events, complete = hub.replay(last_id, subscriber.key)
+            if not complete:
+                yield b'event: reset\ndata: {}\n\n'
+            for event in events:
+                yield event.frame
+            seen = events[-1].id if events else last_id
+        heartbeat = getattr(settings, 'NEWS_LIVE_HEARTBEAT', 15)
+        while not (subscriber.dropped and subscriber.queue.empty()):
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            if seen is None or event.id > seen:
+                yield event.frame
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+@require_GET
+async def live_news(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The live feed is only served under ASGI.'}, status=501)
+    try:
+        category = _optional_int(request.GET.get('category'))
+        district = _optional_int(request.GET.get('district'))
+        last_id = _optional_int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    except ValueError:
+        return JsonResponse({'detail': 'category, district and Last-Event-ID must be integers.'}, status=400)
+    await sync_to_async(get_broker().listen)()
+    response = StreamingHttpResponse(event_stream(category, district, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
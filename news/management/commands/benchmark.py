@@ -0,0 +1,103 @@
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from news import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and benchmark the API endpoints. Fails when a '
+        'query-count or latency budget, or the saved baseline, is exceeded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--news', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Only run these scenarios.')
+        parser.add_argument('--warm', action='store_true', help='Keep the response cache between iterations.')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline.')
+        parser.add_argument('--output', help='Also write this run to the given JSON file.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 regression vs baseline.')
+        parser.add_argument(
+            '--serializers', action='store_true',
+            help='Only compare DRF and compiled news serialization on a page of rows.',
+        )
+        parser.add_argument('--rows', type=int, default=100, help='Page size for --serializers.')
+        parser.add_argument(
+            '--live', action='store_true',
+            help='Only measure live-feed fan-out to idle subscribers (no database).',
+        )
+        parser.add_argument('--subscribers', type=int, default=20000, help='Subscribers for --live.')
+
+    def handle(self, *args, **options):
+        if options['serializers']:
+            return self.compare_serializers(options)
+        if options['live']:
+            return self.live_fanout(options)
+        scenarios = benchmarks.SCENARIOS
+        if options['scenarios']:
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+            if not scenarios:
+                raise CommandError('No matching scenarios.')
+
+        seed = {key: options[key] for key in ('news', 'comments', 'users', 'seed')}
+        with benchmarks.seeded_database(**seed):
+            results = benchmarks.run(scenarios, options['iterations'], options['warm'])
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:28} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                f"{result['queries']:2} queries  {result['bytes']:8} bytes"
+            )
+
+        meta = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            **{key: options[key] for key in ('news', 'comments', 'users', 'seed', 'iterations', 'warm')},
+        }
+        if options['output']:
+            benchmarks.save_results(options['output'], results, meta)
+        if options['save_baseline']:
+            benchmarks.save_results(options['baseline'], results, meta)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}."))
+            return
+
+        failures = benchmarks.check(
+            results, scenarios, benchmarks.load_baseline(options['baseline']), options['tolerance'],
+        )
+        if failures:
+            raise CommandError('Budgets exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All budgets met.'))
+
+    def compare_serializers(self, options):
+        seed = {key: options[key] for key in ('news', 'comments', 'users', 'seed')}
+        with benchmarks.seeded_database(**seed):
+            results = benchmarks.serializer_benchmark(options['rows'], options['iterations'])
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:24} {result['rows']} rows  drf {result['drf_ms']:8.2f}ms  "
+                f"compiled {result['compiled_ms']:8.2f}ms  x{result['speedup']:.2f}  "
+                f"{'identical' if result['identical'] else 'DIFFERENT'}"
+            )
+        if not all(result['identical'] for result in results.values()):
+            raise CommandError('Compiled output differs from DRF output.')
+
+    def live_fanout(self, options):
+        result = benchmarks.live_fanout(options['subscribers'], options['iterations'])
+        self.stdout.write(
+            f"{result['subscribers']} subscribers  {result['subscriber_bytes']} bytes each  "
+            f"p50 {result['p50_ms']:.2f}ms  max {result['max_ms']:.2f}ms  "
+            f"{result['delivered']}/{result['expected']} delivered  "
+            f"{result['wakeups_per_event']:g} wakeups/event"
+        )
+        if result['delivered'] != result['expected']:
+            raise CommandError('Events were not delivered to every matching subscriber.')
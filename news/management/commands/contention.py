@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from news import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and measure concurrent comment writes against '
+        'news reads. On SQLite, compares the tuned pragmas with SQLite defaults.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--news', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=100, help='Operations per thread.')
+        parser.add_argument('--cache', action='store_true', help='Keep the response cache on.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # Defaults first: WAL, once set, sticks to the database file.
+            profiles = [('sqlite-defaults', {}), ('sqlite-tuned', None)]
+        else:
+            profiles = [(connection.vendor, None)]
+        for name, pragmas in profiles:
+            result = self.run(pragmas, options)
+            self.stdout.write(name)
+            for kind in ('write', 'read'):
+                side = result[kind]
+                self.stdout.write(
+                    f"  {kind:5} {side['operations']:6} ops  {side['per_second']:8.1f}/s  "
+                    f"p50 {side['p50_ms']:8.2f}ms  p95 {side['p95_ms']:8.2f}ms  {side['errors']} errors"
+                )
+
+    def run(self, pragmas, options):
+        overrides = {} if pragmas is None else {'NEWS_SQLITE_PRAGMAS': pragmas}
+        seed = {key: options[key] for key in ('news', 'comments', 'users', 'seed')}
+        with tempfile.TemporaryDirectory() as directory, override_settings(**overrides):
+            test_name = os.path.join(directory, 'contention.sqlite3') if connection.vendor == 'sqlite' else None
+            with benchmarks.seeded_database(test_name, **seed):
+                if options['cache']:
+                    return self.measure(options)
+                with benchmarks.response_cache_disabled():
+                    return self.measure(options)
+
+    def measure(self, options):
+        return benchmarks.contention_test(options['writers'], options['readers'], options['operations'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from news import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN every query the news read endpoints run, for all supported filter and '
+        'ordering combinations. Fails when one scans news or comments without an index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths', help='Only audit these paths.')
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not just findings.')
+
+    def handle(self, *args, **options):
+        try:
+            plans = query_plans.audit(options['paths'])
+        except DatabaseError as exc:
+            raise CommandError(f'Could not explain the queries ({exc}). Run `python manage.py migrate` first.')
+        for plan in plans:
+            if options['show_plans'] or plan.full_scans or plan.notes:
+                self.stdout.write(plan.path)
+                self.stdout.write('  ' + plan.sql)
+                for line in plan.lines if options['show_plans'] else plan.full_scans + plan.notes:
+                    self.stdout.write('    ' + line)
+
+        flagged = [plan for plan in plans if plan.full_scans]
+        notes = sum(len(plan.notes) for plan in plans)
+        summary = f'{len(plans)} distinct queries explained, {notes} temporary sorts.'
+        if flagged:
+            raise CommandError(f'{summary} Full scans in {len(flagged)}:\n' + '\n'.join(
+                f'{plan.path}: {line}' for plan in flagged for line in plan.full_scans
+            ))
+        self.stdout.write(self.style.SUCCESS(f'{summary} No full scans.'))
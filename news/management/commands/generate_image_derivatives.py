@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from news import images
+from news.models import News
+
+
+class Command(BaseCommand):
+    help = 'Hash news images that have no content hash yet and render their derivatives.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lazy', action='store_true', help='Only fill hashes; render derivatives on first request.')
+
+    def handle(self, *args, **options):
+        rendered = 0
+        missing = News.objects.exclude(image='').exclude(image__isnull=True).filter(image_hash='')
+        for news in missing.only('image').iterator():
+            news.image_hash, news.image_width = images.inspect_image(news.image)
+            if news.image_hash:
+                News.objects.filter(pk=news.pk).update(image_hash=news.image_hash, image_width=news.image_width)
+        if not options['lazy']:
+            hashed = News.objects.exclude(image_hash='').values_list('image', 'image_hash', 'image_width')
+            for name, digest, width in hashed.distinct().iterator():
+                rendered += len(images.generate_derivatives(name, digest, width))
+        self.stdout.write(self.style.SUCCESS(f'{rendered} derivatives available.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from news.schema import code_version, schema_dir, write_artifacts
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the OpenAPI schema for the current code version to NEWS_SCHEMA_DIR, '
+        'where /api/schema/ loads it instead of generating it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Delete artifacts of other code versions.')
+
+    def handle(self, *args, **options):
+        version = code_version()
+        paths = write_artifacts(version)
+        for path in paths:
+            self.stdout.write(str(path))
+        if options['prune']:
+            for path in schema_dir().glob('openapi-*'):
+                if path not in paths:
+                    path.unlink()
+                    self.stdout.write(f'removed {path}')
+        self.stdout.write(self.style.SUCCESS(f'Schema written for version {version}.'))
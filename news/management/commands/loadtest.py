@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from news import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and compare the WSGI read path with the async '
+        'ASGI one under concurrent load (news list, detail and comment thread).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--news', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument(
+            '--client-delay', type=float, default=0.0,
+            help='Milliseconds each request keeps its slot after the response, to model slow clients.',
+        )
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], action='append', dest='modes')
+        parser.add_argument('--cache', action='store_true', help='Keep the response cache on.')
+
+    def handle(self, *args, **options):
+        seed = {key: options[key] for key in ('news', 'comments', 'users', 'seed')}
+        with benchmarks.seeded_database(**seed):
+            results = []
+            for mode in options['modes'] or ['wsgi', 'asgi']:
+                if options['cache']:
+                    results.append(self.run(mode, options))
+                else:
+                    with benchmarks.response_cache_disabled():
+                        results.append(self.run(mode, options))
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:5} {result['requests']} requests x{result['concurrency']}  "
+                f"{result['rps']:8.1f} req/s  p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                f"{result['errors']} errors"
+            )
+
+    def run(self, mode, options):
+        return benchmarks.load_test(
+            mode, options['requests'], options['concurrency'], options['client_delay'],
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from news import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized counters behind the /count/ endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        counters.rebuild(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Counters rebuilt.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Recreate the news full-text search index from the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        with transaction.atomic(using=options['database']):
+            backend.drop()
+            backend.create()
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt with {type(backend).__name__}.'))
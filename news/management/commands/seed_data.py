@@ -1,136 +1,260 @@
-from django.core.management.base import BaseCommand
-from news.models import District, Area, Category, News, User, Comment
 import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from news import counters
+from news.cache import bump_generation
+from news.models import District, Area, Category, News, User, Comment, Counter
+from news.search import get_search_backend
+
+# Districts and Areas
+DISTRICT_AREA_MAP = {
+    'Central City': ['Downtown', 'Riverside'],
+    'Northville': ['Uptown', 'Greenfield'],
+    'Southtown': ['Lakeside', 'Old Quarter'],
+    'East End': ['Tech Park', 'Sunrise Colony'],
+    'Westfield': ['Hilltop', 'Market Square'],
+}
+
+# News titles and content samples
+NEWS_SAMPLES = {
+    'Politics': [
+        ('Election Results Announced', 'The latest election results have been announced in {area}, {district}.'),
+        ('Mayor Addresses Public', 'The mayor of {district} addressed the public regarding new policies.'),
+        ('Council Approves Budget', 'The city council in {district} has approved the annual budget.'),
+        ('Protest in {area}', 'A peaceful protest was held in {area} demanding reforms.'),
+        ('New Law Passed', 'A new law has been passed affecting residents of {district}.'),
+        ('Political Debate', 'A heated debate took place among candidates in {area}.'),
+        ('Voter Registration Drive', 'A voter registration drive was organized in {area}.'),
+    ],
+    'Sports': [
+        ('Local Team Wins Championship', 'The {area} team clinched the championship in a thrilling match.'),
+        ('Marathon Held in {district}', 'Hundreds participated in the annual marathon in {district}.'),
+        ('Cricket Tournament Finals', 'The finals of the cricket tournament were held at {area} ground.'),
+        ('Football League Kicks Off', 'The football league started with a grand opening in {district}.'),
+        ('Athlete Sets New Record', 'A local athlete from {area} set a new record.'),
+        ('Sports Camp for Youth', 'A sports camp was organized for youth in {area}.'),
+    ],
+    'Technology': [
+        ('Tech Expo in {district}', 'The latest gadgets were showcased at the tech expo in {district}.'),
+        ('Startup Launches App', 'A new app was launched by a startup based in {area}.'),
+        ('Robotics Workshop', 'A robotics workshop was held for students in {area}.'),
+        ('Smart City Project', 'The smart city project was inaugurated in {district}.'),
+        ('AI Conference', 'Experts gathered for an AI conference in {district}.'),
+        ('Innovation Hub Opens', 'A new innovation hub opened in {area}.'),
+    ],
+    'Health': [
+        ('Free Health Camp', 'A free health camp was organized in {area}.'),
+        ('COVID-19 Vaccination Drive', 'A vaccination drive was conducted in {district}.'),
+        ('Yoga Day Celebrated', 'Residents of {area} celebrated International Yoga Day.'),
+        ('Blood Donation Camp', 'A blood donation camp was held in {area}.'),
+        ('Hospital Inaugurated', 'A new hospital was inaugurated in {district}.'),
+        ('Mental Health Awareness', 'A seminar on mental health was held in {area}.'),
+    ],
+    'Entertainment': [
+        ('Film Festival in {district}', 'The annual film festival was held in {district}.'),
+        ('Music Concert Rocks {area}', 'A live music concert entertained crowds in {area}.'),
+        ('Art Exhibition', 'An art exhibition was organized in {area}.'),
+        ('Theatre Play', 'A popular theatre play was staged in {district}.'),
+        ('Celebrity Visits', 'A celebrity visited {area} for a special event.'),
+        ('Food Carnival', 'A food carnival was held in {area} with various cuisines.'),
+    ],
+}
+
+COMMENT_SAMPLES = [
+    'Great coverage, thanks!',
+    'Was there yesterday, can confirm.',
+    'Any update on this?',
+    'This affects our whole neighbourhood.',
+    'Well written article.',
+]
+
+# Sample images (using placeholder URLs)
+IMAGE_URLS = [f'https://picsum.photos/seed/news{i}/600/400' for i in range(1, 11)]
+
+
+@contextmanager
+def manual_timestamps():
+    """Let bulk inserts carry their own created_at/updated_at values."""
+    fields = [
+        News._meta.get_field('created_at'),
+        News._meta.get_field('updated_at'),
+        Comment._meta.get_field('created_at'),
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _worker_init():
+    django.setup()
+    connections.close_all()
+
+
+def insert_news(start, count, seed, batch_size, days, categories, areas, now):
+    """
+    Insert ``count`` articles starting at row ``start``. Every batch seeds its
+    own rng from its absolute offset, so any batch-aligned split across
+    workers produces the same rows.
+    """
+    span = days * 86400
+    with manual_timestamps():
+        for offset in range(0, count, batch_size):
+            rng = random.Random(f'{seed}:news:{start + offset}')
+            batch = []
+            for _ in range(min(batch_size, count - offset)):
+                category_id, category_name = rng.choice(categories)
+                area_id, district_id, area_name, district_name = rng.choice(areas)
+                title_tpl, content_tpl = rng.choice(NEWS_SAMPLES[category_name])
+                created_at = now - timedelta(seconds=rng.randrange(span))
+                batch.append(News(
+                    title=title_tpl.format(area=area_name, district=district_name),
+                    content=content_tpl.format(area=area_name, district=district_name),
+                    category_id=category_id,
+                    area_id=area_id,
+                    district_id=district_id,
+                    image=rng.choice(IMAGE_URLS),
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            with transaction.atomic():
+                News.objects.bulk_create(batch, batch_size=batch_size)
+    return count
+
+
+def insert_comments(start, count, seed, batch_size, days, news_range, user_ids, now):
+    span = days * 86400
+    with manual_timestamps():
+        for offset in range(0, count, batch_size):
+            rng = random.Random(f'{seed}:comments:{start + offset}')
+            batch = [
+                Comment(
+                    news_id=rng.randint(*news_range),
+                    user_id=rng.choice(user_ids),
+                    content=rng.choice(COMMENT_SAMPLES),
+                    created_at=now - timedelta(seconds=rng.randrange(span)),
+                )
+                for _ in range(min(batch_size, count - offset))
+            ]
+            with transaction.atomic():
+                Comment.objects.bulk_create(batch, batch_size=batch_size)
+    return count
+
 
 class Command(BaseCommand):
-    help = 'Seed database with sample data for all APIs.'
-
-    def handle(self, *args, **kwargs):
-        # Clear existing data
-        Comment.objects.all().delete()
-        News.objects.all().delete()
-        Category.objects.all().delete()
-        Area.objects.all().delete()
-        District.objects.all().delete()
-        User.objects.filter(username__in=['admin', 'user']).delete()
-
-        # Districts and Areas
-        district_area_map = {
-            'Central City': ['Downtown', 'Riverside'],
-            'Northville': ['Uptown', 'Greenfield'],
-            'Southtown': ['Lakeside', 'Old Quarter'],
-            'East End': ['Tech Park', 'Sunrise Colony'],
-            'Westfield': ['Hilltop', 'Market Square'],
-        }
-        districts = {}
-        areas = []
-        for d_name, a_names in district_area_map.items():
-            district = District.objects.create(name=d_name)
-            districts[d_name] = district
-            for a_name in a_names:
-                area = Area.objects.create(name=a_name, district=district)
-                areas.append(area)
-
-        # Categories
-        category_names = ['Politics', 'Sports', 'Technology', 'Health', 'Entertainment']
-        categories = [Category.objects.create(name=name) for name in category_names]
-
-        # Users
-        admin = User.objects.create_user(username='admin', email='admin@example.com', password='adminpass', role='admin', is_staff=True)
-        user = User.objects.create_user(username='user', email='user@example.com', password='userpass', role='user')
-
-        # Additional admin and user accounts
-        for i in range(1, 4):
-            User.objects.create_user(
-                username=f'admin{i}',
-                email=f'admin{i}@example.com',
-                password='adminpass',
-                role='admin',
-                is_staff=True
-            )
-            User.objects.create_user(
-                username=f'user{i}',
-                email=f'user{i}@example.com',
-                password='userpass',
-                role='user'
-            )
-
-        # News titles and content samples
-        news_samples = {
-            'Politics': [
-                ('Election Results Announced', 'The latest election results have been announced in {area}, {district}.'),
-                ('Mayor Addresses Public', 'The mayor of {district} addressed the public regarding new policies.'),
-                ('Council Approves Budget', 'The city council in {district} has approved the annual budget.'),
-                ('Protest in {area}', 'A peaceful protest was held in {area} demanding reforms.'),
-                ('New Law Passed', 'A new law has been passed affecting residents of {district}.'),
-                ('Political Debate', 'A heated debate took place among candidates in {area}.'),
-                ('Voter Registration Drive', 'A voter registration drive was organized in {area}.'),
-            ],
-            'Sports': [
-                ('Local Team Wins Championship', 'The {area} team clinched the championship in a thrilling match.'),
-                ('Marathon Held in {district}', 'Hundreds participated in the annual marathon in {district}.'),
-                ('Cricket Tournament Finals', 'The finals of the cricket tournament were held at {area} ground.'),
-                ('Football League Kicks Off', 'The football league started with a grand opening in {district}.'),
-                ('Athlete Sets New Record', 'A local athlete from {area} set a new record.'),
-                ('Sports Camp for Youth', 'A sports camp was organized for youth in {area}.'),
-            ],
-            'Technology': [
-                ('Tech Expo in {district}', 'The latest gadgets were showcased at the tech expo in {district}.'),
-                ('Startup Launches App', 'A new app was launched by a startup based in {area}.'),
-                ('Robotics Workshop', 'A robotics workshop was held for students in {area}.'),
-                ('Smart City Project', 'The smart city project was inaugurated in {district}.'),
-                ('AI Conference', 'Experts gathered for an AI conference in {district}.'),
-                ('Innovation Hub Opens', 'A new innovation hub opened in {area}.'),
-            ],
-            'Health': [
-                ('Free Health Camp', 'A free health camp was organized in {area}.'),
-                ('COVID-19 Vaccination Drive', 'A vaccination drive was conducted in {district}.'),
-                ('Yoga Day Celebrated', 'Residents of {area} celebrated International Yoga Day.'),
-                ('Blood Donation Camp', 'A blood donation camp was held in {area}.'),
-                ('Hospital Inaugurated', 'A new hospital was inaugurated in {district}.'),
-                ('Mental Health Awareness', 'A seminar on mental health was held in {area}.'),
-            ],
-            'Entertainment': [
-                ('Film Festival in {district}', 'The annual film festival was held in {district}.'),
-                ('Music Concert Rocks {area}', 'A live music concert entertained crowds in {area}.'),
-                ('Art Exhibition', 'An art exhibition was organized in {area}.'),
-                ('Theatre Play', 'A popular theatre play was staged in {district}.'),
-                ('Celebrity Visits', 'A celebrity visited {area} for a special event.'),
-                ('Food Carnival', 'A food carnival was held in {area} with various cuisines.'),
-            ],
-        }
-
-        # Sample images (using placeholder URLs)
-        image_urls = [
-            'https://picsum.photos/seed/news1/600/400',
-            'https://picsum.photos/seed/news2/600/400',
-            'https://picsum.photos/seed/news3/600/400',
-            'https://picsum.photos/seed/news4/600/400',
-            'https://picsum.photos/seed/news5/600/400',
-            'https://picsum.photos/seed/news6/600/400',
-            'https://picsum.photos/seed/news7/600/400',
-            'https://picsum.photos/seed/news8/600/400',
-            'https://picsum.photos/seed/news9/600/400',
-            'https://picsum.photos/seed/news10/600/400',
+    help = 'Seed database with sample data for all APIs; scales to millions of rows for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--news', type=int, default=50, help='Number of articles (default 50).')
+        parser.add_argument('--comments', type=int, default=0, help='Number of comments (default 0).')
+        parser.add_argument('--users', type=int, default=3, help='Number of extra regular users (default 3).')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many days.')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Insert articles and comments from this many processes (best with Postgres; '
+                 'SQLite serializes writers).',
+        )
+
+    def handle(self, *args, **options):
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        rng = random.Random(seed)
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        self.clear()
+
+        # Districts, areas and categories
+        districts = District.objects.bulk_create([District(name=name) for name in DISTRICT_AREA_MAP])
+        areas = Area.objects.bulk_create([
+            Area(name=area_name, district=district)
+            for district in districts
+            for area_name in DISTRICT_AREA_MAP[district.name]
+        ])
+        categories = Category.objects.bulk_create([Category(name=name) for name in NEWS_SAMPLES])
+
+        # Users: hash each password once and reuse it
+        admin_password = make_password('adminpass')
+        user_password = make_password('userpass')
+        users = [
+            User(username='admin', email='admin@example.com', password=admin_password, role='admin', is_staff=True),
+            User(username='user', email='user@example.com', password=user_password, role='user'),
+        ]
+        users += [
+            User(username=f'admin{i}', email=f'admin{i}@example.com', password=admin_password, role='admin', is_staff=True)
+            for i in range(1, 4)
         ]
+        users += [
+            User(username=f'user{i}', email=f'user{i}@example.com', password=user_password, role='user')
+            for i in range(1, options['users'] + 1)
+        ]
+        with transaction.atomic():
+            users = User.objects.bulk_create(users, batch_size=batch_size)
+        user_ids = [user.pk for user in users]
 
-        # News
-        for category in categories:
-            samples = news_samples[category.name]
-            num_news = random.randint(5, 10)
-            for i in range(num_news):
-                area = random.choice(areas)
-                district = area.district
-                title_tpl, content_tpl = random.choice(samples)
-                title = title_tpl.format(area=area.name, district=district.name)
-                content = content_tpl.format(area=area.name, district=district.name)
-                image_url = random.choice(image_urls)
-                News.objects.create(
-                    title=title,
-                    content=content,
-                    category=category,
-                    area=area,
-                    image=image_url
-                )
+        category_rows = [(category.pk, category.name) for category in categories]
+        area_rows = [(area.pk, area.district_id, area.name, area.district.name) for area in areas]
+        news_seed = rng.randrange(2 ** 32)
+        self.run_chunks(insert_news, options['news'], options, news_seed, category_rows, area_rows, now)
+
+        if options['comments'] and options['news']:
+            news_range = (News.objects.order_by('id').values_list('id', flat=True).first(),
+                          News.objects.order_by('-id').values_list('id', flat=True).first())
+            comment_seed = rng.randrange(2 ** 32)
+            self.run_chunks(insert_comments, options['comments'], options, comment_seed, news_range, user_ids, now)
+
+        self.rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['news']} news, {options['comments']} comments and {len(users)} users (seed {seed})."
+        ))
+
+    def clear(self):
+        # Truncate instead of Model.delete() so millions of rows are not
+        # loaded for cascades and signals; sequences restart so ids are dense.
+        tables = [model._meta.db_table for model in (Comment, News, Area, Category, District, Counter)]
+        with transaction.atomic():
+            connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+            User.objects.filter(username__in=['admin', 'user']).delete()
+            User.objects.filter(username__regex=r'^(admin|user)[0-9]+$').delete()
+
+    def run_chunks(self, insert, total, options, seed, *args):
+        """Split ``total`` rows into batch-aligned chunks, in-process or across workers."""
+        batch_size = options['batch_size']
+        workers = max(1, options['workers'])
+        chunk = max(batch_size, -(-total // workers // batch_size) * batch_size)
+        jobs = [
+            (start, min(chunk, total - start), seed, batch_size, options['days'], *args)
+            for start in range(0, total, chunk)
+        ]
+        if workers == 1 or len(jobs) == 1:
+            for job in jobs:
+                insert(*job)
+            return
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            for future in [pool.submit(insert, *job) for job in jobs]:
+                future.result()
 
-        self.stdout.write(self.style.SUCCESS('Sample data with 5 categories and 5-10 news per category created.'))
+    def rebuild_derived_data(self):
+        # bulk_create bypasses the signals maintaining these.
+        counters.rebuild()
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.drop()
+            backend.create()
+            backend.rebuild()
+        bump_generation('news', 'category', 'area', 'district')
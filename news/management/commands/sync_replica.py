@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from news.replicas import replica_health
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default SQLite database into the SQLite files configured as read '
+        'replicas, standing in for replication when testing replica routing locally.'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [alias for alias in settings.NEWS_READ_REPLICAS if connections[alias].vendor == 'sqlite']
+        if primary.vendor != 'sqlite' or not replicas:
+            raise CommandError('Needs a SQLite default database and SQLite replicas (SQLITE_REPLICA_PATH).')
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f'{DEFAULT_DB_ALIAS} -> {alias} ({replica.settings_dict["NAME"]})')
+        replica_health.clear()
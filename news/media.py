@@ -0,0 +1,156 @@
+import hashlib
+import mimetypes
+import posixpath
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+from .images import DERIVED_PATH_RE
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=3600'
+
+
+@lru_cache(maxsize=4096)
+def _content_etag(path, mtime_ns, size):
+    # mtime and size are part of the cache key so rewritten files are rehashed.
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def content_etag(fullpath, stat):
+    """Strong ETag from the file's content hash, memoized per (path, mtime, size)."""
+    return _content_etag(str(fullpath), stat.st_mtime_ns, stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` inclusive byte offsets for a single-range ``Range`` header,
+    None to serve the whole file, or ``'unsatisfiable'``.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+class RangeFile:
+    """
+    File wrapper limited to ``length`` bytes from its current position. It
+    keeps ``fileno()`` so servers using ``wsgi.file_wrapper`` can still
+    ``sendfile()`` the range, bounded by Content-Length.
+    """
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _offloaded_response(mode, path, fullpath, content_type):
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'NEWS_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + path)
+    else:
+        response['X-Sendfile'] = str(fullpath)
+    return response
+
+
+def serve(request, path, document_root=None):
+    """
+    Serve a file below MEDIA_ROOT.
+
+    ``NEWS_MEDIA_SERVE_MODE`` picks who writes the bytes: ``'x-accel-redirect'``
+    (nginx) or ``'x-sendfile'`` (Apache, lighttpd) hand delivery to the front
+    server, ``'django'`` streams the file itself through ``FileResponse`` so
+    WSGI servers with a ``sendfile``-capable file wrapper send it zero-copy.
+    Validators, conditional requests and cache headers are handled here in
+    every mode; single byte ranges are answered by Django in ``'django'`` mode.
+    """
+    document_root = document_root or settings.MEDIA_ROOT
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(document_root, path))
+    if not fullpath.is_file():
+        raise Http404('File does not exist')
+
+    stat = fullpath.stat()
+    etag = content_etag(fullpath, stat)
+    content_type = mimetypes.guess_type(str(fullpath))[0] or 'application/octet-stream'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        # Content-addressed derivatives never change meaning, so clients may keep them forever.
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if DERIVED_PATH_RE.fullmatch(path) else REVALIDATE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        not_modified = if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    else:
+        not_modified = not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime)
+    if not_modified:
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    mode = getattr(settings, 'NEWS_MEDIA_SERVE_MODE', 'django')
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        response = _offloaded_response(mode, path, fullpath, content_type)
+    else:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and if_range.strip() != etag:
+            byte_range = None
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(fullpath.open('rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(fullpath.open('rb'), start, length), content_type=content_type, status=206)
+            response['Content-Length'] = length
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    for header, value in headers.items():
+        response[header] = value
+    return response
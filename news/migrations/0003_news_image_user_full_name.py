@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_district_area_district'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='news_images/'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='full_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
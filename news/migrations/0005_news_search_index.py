@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from news.search import get_search_backend_class
+    backend = get_search_backend_class(schema_editor.connection)(schema_editor.connection)
+    backend.create()
+    backend.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    from news.search import get_search_backend_class
+    get_search_backend_class(schema_editor.connection)(schema_editor.connection).drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_news_comment_created_id_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    from news.counters import rebuild
+    rebuild(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_news_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.BigIntegerField(default=0)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'key'), name='counter_name_key_unique')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
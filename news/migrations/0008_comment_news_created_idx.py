@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_news_image_hash_width'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['news', '-created_at', '-id'], name='comment_news_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_comment_news_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['updated_at', 'id'], name='news_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_district(apps, schema_editor):
+    News = apps.get_model('news', 'News')
+    Area = apps.get_model('news', 'Area')
+    News.objects.using(schema_editor.connection.alias).update(
+        district=Subquery(Area.objects.filter(pk=OuterRef('area_id')).values('district_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_news_updated_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='district',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='news', to='news.district'),
+        ),
+        migrations.RunPython(fill_district, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='news',
+            name='district',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='news', to='news.district'),
+        ),
+        migrations.AlterField(
+            model_name='news',
+            name='area',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='news', to='news.area'),
+        ),
+        migrations.AlterField(
+            model_name='news',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='news', to='news.category'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='news_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['area', '-created_at', '-id'], name='news_area_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['district', '-created_at', '-id'], name='news_district_created_idx'),
+        ),
+    ]
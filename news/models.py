@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 
 # Create your models here.
 
+class AtomicSaveMixin:
+    """Runs save() and its post_save receivers (counters, search) in one transaction."""
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
 class User(AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
@@ -15,7 +22,7 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
-class Category(models.Model):
+class Category(AtomicSaveMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
@@ -29,7 +36,7 @@ class District(models.Model):
         return self.name
 
 
-class Area(models.Model):
+class Area(AtomicSaveMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
     district = models.ForeignKey('District', on_delete=models.CASCADE, related_name='areas')
 
@@ -37,26 +44,70 @@ class Area(models.Model):
         return f"{self.name} ({self.district.name})"
 
 
-class News(models.Model):
+class News(AtomicSaveMixin, models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
     image = models.ImageField(upload_to='news_images/', null=True, blank=True)
+    # Content hash and width of the original image; derivatives are stored
+    # under the hash (see news.images).
+    image_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # The relation indexes below lead with these columns, so the FKs need none of their own.
     category = models.ForeignKey(
-        Category, on_delete=models.CASCADE, related_name="news"
+        Category, on_delete=models.CASCADE, related_name="news", db_index=False
+    )
+    area = models.ForeignKey(Area, on_delete=models.CASCADE, related_name="news", db_index=False)
+    # Copy of area.district so district filters skip the join; kept in sync by signals.
+    district = models.ForeignKey(
+        District, on_delete=models.CASCADE, related_name="news", db_index=False, editable=False
     )
-    area = models.ForeignKey(Area, on_delete=models.CASCADE, related_name="news")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='news_created_id_idx'),
+            # Export checkpoints and list Last-Modified walk (updated_at, id).
+            models.Index(fields=['updated_at', 'id'], name='news_updated_id_idx'),
+            # Each filter the list supports, in the feed's (created_at, id) order.
+            models.Index(fields=['category', '-created_at', '-id'], name='news_category_created_idx'),
+            models.Index(fields=['area', '-created_at', '-id'], name='news_area_created_idx'),
+            models.Index(fields=['district', '-created_at', '-id'], name='news_district_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveMixin, models.Model):
     news = models.ForeignKey(News, on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(fields=['news', '-created_at', '-id'], name='comment_news_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user} on {self.news}"
+
+
+class Counter(models.Model):
+    """
+    Denormalized row counts maintained by signals. ``name`` identifies what is
+    counted (e.g. ``news.category``) and ``key`` the related id, 0 for totals.
+    """
+    name = models.CharField(max_length=50)
+    key = models.BigIntegerField(default=0)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'key'], name='counter_name_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.key}] = {self.value}"
@@ -0,0 +1,102 @@
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.settings import api_settings
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``(created_at, id)``. Each page is a single indexed
+    range scan, so deep pages cost the same as the first one.
+
+    Full-text search results are paged by relevance instead, unless the client
+    asked for an explicit ``?ordering=``.
+
+    ``paginate_queryset`` is DRF's, split around the one query it runs so
+    ``apaginate_queryset`` can fetch the page with the async ORM.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(api_settings.ORDERING_PARAM):
+            return ('search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.get_page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page([obj async for obj in window])
+
+    def get_page_window(self, queryset, request, view=None):
+        """The unevaluated slice holding the page plus one row of lookahead."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+            if self.cursor.reverse != is_reversed:
+                kwargs = {order_attr + '__lt': current_position}
+            else:
+                kwargs = {order_attr + '__gt': current_position}
+            queryset = queryset.filter(**kwargs)
+
+        self._window = (offset, reverse, current_position)
+        return queryset[offset:offset + self.page_size + 1]
+
+    def set_page(self, results):
+        offset, reverse, current_position = self._window
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
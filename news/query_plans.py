@@ -0,0 +1,159 @@
+"""
+EXPLAIN audit of the news read queries.
+
+``audit`` requests the news list with every combination of the filters
+NewsViewSet supports, in each ordering, plus the other news read endpoints.
+It records the SELECTs each request runs and asks the database for their
+plans. A query that reads ``news_news`` or ``news_comment`` row by row
+instead of searching an index is reported as a full scan. Sorts through a
+temporary b-tree are reported as notes. Driven by ``manage.py explain_queries``.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from itertools import combinations
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from .benchmarks import response_cache_disabled
+from .models import Area, Category, Comment, News
+
+AUDITED_TABLES = (News._meta.db_table, Comment._meta.db_table)
+
+LIST_FILTERS = ['category', 'area', 'district', 'area__name', 'area__district__name']
+LIST_ORDERINGS = ['', 'created_at', '-created_at']
+
+_ALIAS_RE = re.compile(r'"(\w+)"\s+(?:AS\s+)?("?\w+"?)(?=\s|$|,|\))', re.IGNORECASE)
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (\S+)(?: AS (\S+))?(.*)$')
+
+
+@dataclass
+class Plan:
+    path: str
+    sql: str
+    lines: list
+    full_scans: list = field(default_factory=list)
+    notes: list = field(default_factory=list)
+
+
+def audit_paths(values):
+    """Every path the audit requests, with ``values`` supplying the filter arguments."""
+    paths = []
+    for size in range(len(LIST_FILTERS) + 1):
+        for names in combinations(LIST_FILTERS, size):
+            for ordering in LIST_ORDERINGS:
+                params = {name: values[name] for name in names}
+                if ordering:
+                    params['ordering'] = ordering
+                paths.append('/api/news/' + ('?' + urlencode(params) if params else ''))
+    for name in ('category', 'area', 'district'):
+        paths.append(f'/api/news/count/?{name}={values[name]}')
+    paths += [
+        f"/api/news/{values['news']}/",
+        f"/api/news/{values['news']}/comments/",
+        f"/api/comments/?news={values['news']}",
+        '/api/news/export/',
+        f"/api/news/export/?{urlencode({'since': values['since'], 'since_id': values['news']})}",
+    ]
+    return paths
+
+
+def audit_values():
+    news = News.objects.order_by('-created_at', '-id').select_related('area__district').first()
+    area = news.area if news else Area.objects.select_related('district').first()
+    return {
+        'news': news.pk if news else 0,
+        'since': news.updated_at.isoformat() if news else '2000-01-01T00:00:00+00:00',
+        'category': news.category_id if news else Category.objects.values_list('pk', flat=True).first() or 0,
+        'area': area.pk if area else 0,
+        'district': area.district_id if area else 0,
+        'area__name': area.name if area else '',
+        'area__district__name': area.district.name if area else '',
+    }
+
+
+def capture_selects(client, path):
+    """The ``(sql, params)`` of every SELECT a GET of ``path`` runs."""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        response = client.get(path)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return statements
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            return _postgres_lines(cursor.fetchone()[0])
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _postgres_lines(plan):
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines = []
+
+    def walk(node, depth=0):
+        relation = node.get('Relation Name')
+        index = node.get('Index Name')
+        lines.append('  ' * depth + node['Node Type'] + (f' on {relation}' if relation else '')
+                     + (f' using {index}' if index else ''))
+        for child in node.get('Plans', ()):
+            walk(child, depth + 1)
+    walk(plan[0]['Plan'])
+    return lines
+
+
+def classify(plan):
+    """Fill ``plan.full_scans`` and ``plan.notes`` from its plan lines."""
+    aliases = {alias.strip('"'): table for table, alias in _ALIAS_RE.findall(plan.sql)}
+    for line in plan.lines:
+        text = line.strip()
+        if connection.vendor == 'postgresql':
+            if text.startswith('Seq Scan on '):
+                table = text.split()[3]
+                if table in AUDITED_TABLES:
+                    plan.full_scans.append(text)
+            elif text.startswith('Sort'):
+                plan.notes.append(text)
+            continue
+        match = _SQLITE_SCAN_RE.match(text)
+        if match:
+            name, rest = match.group(1), match.group(3)
+            table = aliases.get(name, name)
+            if table in AUDITED_TABLES and 'INDEX' not in rest and 'VIRTUAL TABLE' not in rest:
+                plan.full_scans.append(text)
+        elif 'TEMP B-TREE' in text:
+            plan.notes.append(text)
+    return plan
+
+
+def audit(paths=None):
+    """A classified Plan for every SELECT the audited requests run."""
+    client = Client()
+    paths = paths or audit_paths(audit_values())
+    plans, seen = [], set()
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with response_cache_disabled(), override_settings(ALLOWED_HOSTS=hosts):
+        for path in paths:
+            for sql, params in capture_selects(client, path):
+                if sql in seen:
+                    continue
+                seen.add(sql)
+                plans.append(classify(Plan(path, sql, explain(sql, params))))
+    return plans
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import namedtuple
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from .cache import REFERENCE_GENERATIONS, get_generations
+from .replicas import primary_reads
+from .compression import available_encodings, compress
+from .models import Category, District, Area
+from .serializers import CategorySerializer, DistrictSerializer, AreaSerializer
+
+Bundle = namedtuple('Bundle', ['generations', 'etag', 'body', 'encoded'])
+
+# Highest level per coding: a bundle is compressed once per build, not per request.
+MAX_LEVELS = {'gzip': 9, 'br': 11, 'zstd': 19}
+
+
+class ReferenceDataSerializer(serializers.Serializer):
+    categories = CategorySerializer(many=True)
+    districts = DistrictSerializer(many=True)
+    areas = AreaSerializer(many=True)
+
+
+def build_reference_data():
+    return ReferenceDataSerializer({
+        'categories': Category.objects.order_by('id'),
+        'districts': District.objects.order_by('id'),
+        'areas': Area.objects.select_related('district').order_by('id'),
+    }).data
+
+
+class ReferenceBundle:
+    """
+    Rendered categories/districts/areas held in process memory, with a strong
+    ETag and a copy per available coding (news.compression) made once per
+    build.
+
+    The bundle remembers the reference generations it was built from (see
+    news.cache); requests compare them with a cache lookup and rebuild only
+    when a signal has bumped one, so steady-state requests never touch the
+    database. Builds read the primary, so a lagging replica cannot pin old
+    names to the new generations.
+    """
+    def __init__(self):
+        self._bundle = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        generations = tuple(get_generations(*REFERENCE_GENERATIONS))
+        bundle = self._bundle
+        if bundle is None or bundle.generations != generations:
+            with self._lock:
+                bundle = self._bundle
+                if bundle is None or bundle.generations != generations:
+                    bundle = self._bundle = self.build(generations)
+        return bundle
+
+    def refresh(self):
+        with self._lock:
+            self._bundle = self.build(get_generations(*REFERENCE_GENERATIONS))
+
+    def clear(self):
+        self._bundle = None
+
+    @staticmethod
+    def build(generations):
+        with primary_reads():
+            body = JSONRenderer().render(build_reference_data())
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        encoded = {coding: compress(body, coding, MAX_LEVELS.get(coding)) for coding in available_encodings()}
+        return Bundle(tuple(generations), etag, body, encoded)
+
+
+reference_bundle = ReferenceBundle()
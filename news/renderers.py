@@ -0,0 +1,30 @@
+"""
+JSON rendering for the news endpoints.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer``. It
+uses orjson when that is installed (optional: ``pip install orjson``) and
+falls back to the stdlib encoder for payloads orjson rejects: non-string
+keys and integers wider than 64 bits. orjson writes float exponents
+differently (``1e16`` rather than ``1e+16``), so use it only for payloads
+without floats, as on NewsViewSet.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Datetimes go through the DRF encoder, which trims microseconds to milliseconds.
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these so the output stays a JavaScript subset.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,220 @@
+"""
+Read-replica routing.
+
+``ReplicaRoutingMiddleware`` picks a replica from ``NEWS_READ_REPLICAS`` for
+each safe-method request and ``ReplicaRouter`` sends that request's reads to
+it. Everything else reads from ``default``: writes, anything inside a
+transaction, replicas lagging more than ``NEWS_REPLICA_MAX_LAG`` seconds, and
+clients that wrote within ``NEWS_REPLICA_STICKY_SECONDS``, so authors see
+their own comments. A client is remembered by a cookie and, when it sends
+credentials, by a cache entry keyed on them.
+
+Caches keyed on invalidation generations (news.cache, news.reference) must
+not be filled from a replica: a lagging replica would store pre-write rows
+under the generation the write just bumped. They check
+``reading_from_replica()`` or build under ``primary_reads()``.
+"""
+import hashlib
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Max
+
+_read_alias = ContextVar('news_read_alias', default=None)
+_rotation = itertools.count()
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def read_replicas():
+    return list(getattr(settings, 'NEWS_READ_REPLICAS', ()))
+
+
+def sticky_seconds():
+    return getattr(settings, 'NEWS_REPLICA_STICKY_SECONDS', 10)
+
+
+def replica_lag(alias):
+    """
+    Seconds ``alias`` trails the primary.
+
+    Only Postgres reports real replay lag. Elsewhere this is how much older
+    the replica's newest news/comment timestamp is than the primary's: 0
+    when it has the latest write, otherwise the time between its latest
+    write and the primary's, which is not how long ago it stopped
+    replicating. Deletes are not seen at all.
+    """
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            return float(cursor.fetchone()[0])
+    # No replication status to ask for: compare the newest writes instead.
+    from .models import Comment, News
+    lag = 0.0
+    for model, field in ((News, 'updated_at'), (Comment, 'created_at')):
+        primary = model.objects.using(DEFAULT_DB_ALIAS).aggregate(newest=Max(field))['newest']
+        replica = model.objects.using(alias).aggregate(newest=Max(field))['newest']
+        if primary and (replica is None or replica < primary):
+            lag = max(lag, (primary - replica).total_seconds() if replica else float('inf'))
+    return lag
+
+
+def reading_from_replica():
+    """Whether reads in the current request go to a replica."""
+    return _read_alias.get() is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads inside to ``default`` even when the request uses a replica."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaHealth:
+    """Per-process record of which replicas are within the lag limit, rechecked every few seconds."""
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def is_usable(self, alias):
+        interval = getattr(settings, 'NEWS_REPLICA_CHECK_INTERVAL', 5)
+        checked = self._checked.get(alias)
+        if checked is not None and checked[0] > time.monotonic():
+            return checked[1]
+        with self._lock:
+            try:
+                usable = replica_lag(alias) <= getattr(settings, 'NEWS_REPLICA_MAX_LAG', 5)
+            except DatabaseError:
+                usable = False
+            self._checked[alias] = (time.monotonic() + interval, usable)
+        return usable
+
+    def clear(self):
+        self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+def choose_replica():
+    """A usable replica, rotating between them, or None for the primary."""
+    replicas = read_replicas()
+    if not replicas:
+        return None
+    start = next(_rotation)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if replica_health.is_usable(alias):
+            return alias
+    return None
+
+
+def _client_key(request):
+    credential = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SIMPLE_JWT.get('AUTH_COOKIE', 'access_token'))
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credential:
+        return None
+    return 'replica:primary:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+def sticks_to_primary(request):
+    if request.COOKIES.get(getattr(settings, 'NEWS_REPLICA_STICKY_COOKIE', 'news_primary')):
+        return True
+    key = _client_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def stick_to_primary(request, response):
+    seconds = sticky_seconds()
+    if seconds <= 0:
+        return
+    response.set_cookie(
+        getattr(settings, 'NEWS_REPLICA_STICKY_COOKIE', 'news_primary'), '1',
+        max_age=seconds, httponly=True, samesite='Lax',
+    )
+    key = _client_key(request)
+    if key is not None:
+        cache.set(key, True, seconds)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _read_alias.set(self.read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        # The lag check may query, so it runs off the event loop.
+        alias = await sync_to_async(self.read_alias)(request) if read_replicas() else None
+        token = _read_alias.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.process_response(request, response)
+
+    def read_alias(self, request):
+        if request.method in SAFE_METHODS and not sticks_to_primary(request):
+            return choose_replica()
+        return None
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and read_replicas():
+            stick_to_primary(request, response)
+        return response
+
+
+class ReplicaRouter:
+    """Reads go to the replica the middleware picked for the request; writes to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *read_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in read_replicas():
+            return False
+        return None
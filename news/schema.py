@@ -0,0 +1,156 @@
+"""
+The OpenAPI schema, generated once per code version.
+
+drf-spectacular introspects every view and serializer to build the schema,
+which ``SpectacularAPIView`` does on each request. ``CachedSchemaView``
+instead serves rendered bodies from ``schema_store``. The store builds them
+once per process and ``code_version()``, preferring the artifacts
+``python manage.py generate_schema`` writes to ``NEWS_SCHEMA_DIR``
+(``openapi-<version>.<format>``). Responses carry a strong ETag and the
+compressed copies are kept next to each body (news.compression).
+
+``code_version()`` is ``NEWS_CODE_VERSION`` when set (e.g. the deployed
+commit), otherwise a digest of the project's Python sources and the schema
+libraries' versions, so any code change produces a new schema.
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from importlib import import_module
+from pathlib import Path
+
+import drf_spectacular
+import rest_framework
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+from .compression import Precompressed
+
+SchemaDocument = namedtuple('SchemaDocument', ['etag', 'body', 'precompressed'])
+
+SCHEMA_RENDERERS = SpectacularAPIView.renderer_classes
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest(root_urlconf):
+    base_dir = str(settings.BASE_DIR)
+    roots = {config.path for config in apps.get_app_configs() if config.path.startswith(base_dir)}
+    roots.add(os.path.dirname(import_module(root_urlconf).__file__))
+    digest = hashlib.sha256(f'{drf_spectacular.__version__}|{rest_framework.__version__}|{root_urlconf}'.encode())
+    for root in sorted(roots):
+        for path in sorted(Path(root).rglob('*.py')):
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def code_version():
+    return getattr(settings, 'NEWS_CODE_VERSION', '') or _source_digest(settings.ROOT_URLCONF)
+
+
+def schema_dir():
+    return Path(getattr(settings, 'NEWS_SCHEMA_DIR', settings.BASE_DIR / 'build' / 'schema'))
+
+
+def artifact_path(version, renderer_class):
+    return schema_dir() / f'openapi-{version}.{renderer_class.format}'
+
+
+def generate_schema():
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema(schema, renderer_class):
+    return renderer_class().render(schema, renderer_class.media_type, {})
+
+
+def write_artifact(path, body):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'.{path.name}.{os.getpid()}')
+    partial.write_bytes(body)
+    os.replace(partial, path)
+
+
+def write_artifacts(version=None):
+    """Render the schema in every format into ``NEWS_SCHEMA_DIR``; returns the paths."""
+    version = version or code_version()
+    schema = generate_schema()
+    paths = []
+    for renderer_class in {renderer_class.format: renderer_class for renderer_class in SCHEMA_RENDERERS}.values():
+        path = artifact_path(version, renderer_class)
+        write_artifact(path, render_schema(schema, renderer_class))
+        paths.append(path)
+    return paths
+
+
+class SchemaStore:
+    """Rendered schema bodies for the current code version, per renderer format."""
+    def __init__(self):
+        self._version = None
+        self._schema = None
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def get(self, renderer_class):
+        version = code_version()
+        document = self._documents.get(renderer_class.format) if self._version == version else None
+        if document is None:
+            with self._lock:
+                if self._version != version:
+                    self._version, self._schema, self._documents = version, None, {}
+                document = self._documents.get(renderer_class.format)
+                if document is None:
+                    document = self._documents[renderer_class.format] = self.load(version, renderer_class)
+        return document
+
+    def load(self, version, renderer_class):
+        path = artifact_path(version, renderer_class)
+        try:
+            body = path.read_bytes()
+        except FileNotFoundError:
+            if self._schema is None:
+                self._schema = generate_schema()
+            body = render_schema(self._schema, renderer_class)
+            try:
+                write_artifact(path, body)
+            except OSError:
+                pass
+        return SchemaDocument(f'"{hashlib.sha256(body).hexdigest()[:32]}"', body, Precompressed(body))
+
+    def clear(self):
+        with self._lock:
+            self._version, self._schema, self._documents = None, None, {}
+
+
+schema_store = SchemaStore()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    ``SpectacularAPIView`` served from ``schema_store``. Requests for another
+    language, API version or indentation are still generated per request.
+    """
+    cache_control = 'public, no-cache'
+
+    def _get_schema_response(self, request):
+        if request.GET.get('lang') or request.GET.get('version') or ';' in request.accepted_media_type:
+            return super()._get_schema_response(request)
+        renderer = request.accepted_renderer
+        document = schema_store.get(type(renderer))
+        response = get_conditional_response(request, etag=document.etag)
+        if response is None:
+            media_type = request.accepted_media_type
+            content_type = f'{media_type}; charset={renderer.charset}' if renderer.charset else media_type
+            response = HttpResponse(document.body, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+            response.precompressed = document.precompressed
+        response['ETag'] = document.etag
+        response['Cache-Control'] = self.cache_control
+        return response
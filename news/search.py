@@ -0,0 +1,248 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import Category, District, Area, News
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _source_sql(where):
+    """Rows to index: one per article with its denormalized relation names."""
+    return (
+        f'SELECT n.id, n.title, n.content, c.name, a.name, d.name '
+        f'FROM {News._meta.db_table} n '
+        f'JOIN {Category._meta.db_table} c ON c.id = n.category_id '
+        f'JOIN {Area._meta.db_table} a ON a.id = n.area_id '
+        f'JOIN {District._meta.db_table} d ON d.id = a.district_id '
+        f'WHERE {where}'
+    )
+
+
+class BaseSearchBackend:
+    """
+    Keeps a search index of News in sync and answers ranked queries.
+
+    ``search`` returns the queryset restricted to matches and annotated with
+    ``search_rank``; lower ranks are better so callers can always order
+    ascending, whatever the engine's native scoring direction.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        pass
+
+    def drop(self):
+        pass
+
+    def reindex(self, where='1=1', params=()):
+        pass
+
+    def remove(self, news_id):
+        self.remove_many([news_id])
+
+    def remove_many(self, news_ids, batch_size=500):
+        news_ids = list(news_ids)
+        for start in range(0, len(news_ids), batch_size):
+            batch = news_ids[start:start + batch_size]
+            self.unindex(f"IN ({', '.join(['%s'] * len(batch))})", batch)
+
+    def unindex(self, condition, params):
+        pass
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_news(self, news_id):
+        self.reindex('n.id = %s', [news_id])
+
+    def index_news_many(self, news_ids, batch_size=500):
+        news_ids = list(news_ids)
+        for start in range(0, len(news_ids), batch_size):
+            batch = news_ids[start:start + batch_size]
+            self.reindex(f"n.id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+    def index_category(self, category_id):
+        self.reindex('n.category_id = %s', [category_id])
+
+    def index_area(self, area_id):
+        self.reindex('n.area_id = %s', [area_id])
+
+    def index_district(self, district_id):
+        self.reindex('a.district_id = %s', [district_id])
+
+    def rebuild(self):
+        self.reindex()
+
+    @staticmethod
+    def tokenize(query):
+        return TOKEN_RE.findall(query)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """FTS5 virtual table keyed by news id, ranked with BM25."""
+    table = 'news_search'
+    # bm25() column weights: title, content, category, area, district
+    weights = (10.0, 1.0, 2.0, 2.0, 2.0)
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                f'title, content, category, area, district, '
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def reindex(self, where='1=1', params=()):
+        source = _source_sql(where)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN (SELECT id FROM ({source}))', params)
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, content, category, area, district) {source}',
+                params,
+            )
+
+    def unindex(self, condition, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid {condition}', params)
+
+    def match_expression(self, query):
+        return ' '.join(f'"{token}"*' for token in self.tokenize(query))
+
+    def search(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset
+        weights = ', '.join(str(weight) for weight in self.weights)
+        news_id = f'{self.connection.ops.quote_name(News._meta.db_table)}.id'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [expression]),
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = {news_id}',
+                [expression],
+                output_field=FloatField(),
+            ),
+        ).order_by('search_rank', '-id')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Side table of weighted ``tsvector`` documents behind a GIN index."""
+    table = 'news_search'
+    config = 'simple'
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                f'news_id bigint PRIMARY KEY REFERENCES {News._meta.db_table} (id) ON DELETE CASCADE, '
+                f'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_document_gin ON {self.table} USING GIN (document)')
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def reindex(self, where='1=1', params=()):
+        config = self.config
+        document = (
+            f"setweight(to_tsvector('{config}', src.title), 'A') || "
+            f"setweight(to_tsvector('{config}', src.content), 'D') || "
+            f"setweight(to_tsvector('{config}', src.category || ' ' || src.area || ' ' || src.district), 'B')"
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (news_id, document) '
+                f'SELECT src.id, {document} '
+                f'FROM ({_source_sql(where)}) AS src (id, title, content, category, area, district) '
+                f'ON CONFLICT (news_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def unindex(self, condition, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE news_id {condition}', params)
+
+    def match_expression(self, query):
+        return ' & '.join(f'{token}:*' for token in self.tokenize(query))
+
+    def search(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset
+        tsquery = f"to_tsquery('{self.config}', %s)"
+        news_id = f'{self.connection.ops.quote_name(News._meta.db_table)}.id'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT news_id FROM {self.table} WHERE document @@ {tsquery}', [expression]),
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -ts_rank_cd(document, {tsquery}) FROM {self.table} WHERE news_id = {news_id}',
+                [expression],
+                output_field=FloatField(),
+            ),
+        ).order_by('search_rank', '-id')
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for databases without a full-text engine."""
+    fields = ['title', 'content', 'category__name', 'area__name', 'area__district__name']
+
+    def search(self, queryset, query):
+        for token in self.tokenize(query):
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': token})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend_class(connection):
+    path = getattr(settings, 'NEWS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)
+    return VENDOR_BACKENDS.get(connection.vendor, IcontainsSearchBackend)
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    return get_search_backend_class(connection)(connection)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """Drop-in replacement for ``SearchFilter`` backed by the search index."""
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over title, content, category, area and district. '
+                           'Every word is prefix-matched; results are ranked by relevance.',
+            'schema': {'type': 'string'},
+        }]
@@ -1,19 +1,276 @@
-from rest_framework import serializers
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db import models
+from django.db.models.functions import Substr
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
 from .models import Category, Area, News, Comment, User, District
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from drf_spectacular.utils import extend_schema_field
+from .images import build_srcset
+from . import counters
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer describe the relations it reads so views can shape the
+    queryset up front. Forward relations rendered by nested serializers or
+    related fields become ``select_related`` paths, to-many relations become
+    ``prefetch_related`` paths. Extra paths (e.g. for method fields) can be
+    listed in ``select_related_fields`` / ``prefetch_related_fields``.
+
+    With ``restrict_columns`` the queryset is also limited with ``.only()``
+    to the columns the current field set renders. Method fields then have
+    to declare the attributes they read in ``method_field_sources``; sources
+    that are not model fields are taken to be annotations.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    restrict_columns = False
+    method_field_sources = {}
+
+    _query_shape_cache = {}
+
+    def get_query_shape(self):
+        key = (type(self), tuple(self.fields))
+        if key not in self._query_shape_cache:
+            select, prefetch = _collect_related_paths(self)
+            select.update(self.select_related_fields)
+            prefetch.update(self.prefetch_related_fields)
+            only = _collect_only_paths(self, self.Meta.model) if self.restrict_columns else None
+            self._query_shape_cache[key] = (sorted(select), sorted(prefetch), sorted(only) if only else None)
+        return self._query_shape_cache[key]
+
+    def annotate_queryset(self, queryset):
+        return queryset
+
+    def setup_eager_loading(self, queryset):
+        select, prefetch, only = self.get_query_shape()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if only:
+            queryset = queryset.only(*only)
+        return self.annotate_queryset(queryset)
+
+
+class SparseFieldsetMixin:
+    """
+    ``?fields=a,b`` keeps only the named fields and ``?omit=a,b`` drops them
+    from read responses. Applies to the top-level serializer of a request.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        params = getattr(request, 'query_params', request.GET)
+        only = _split_names(params.get('fields'))
+        omit = _split_names(params.get('omit'))
+        for name in list(self.fields):
+            if (only and name not in only) or name in omit:
+                self.fields.pop(name)
+
+
+_SKIP = object()
+
+
+class CompiledRepresentationMixin:
+    """
+    Read-side ``to_representation`` driven by a plan compiled once per
+    serializer instance (so once per request for ``many=True``). Fields are
+    resolved to direct steps up front: plain model columns are read with
+    ``attrgetter``, pk-only relations from their ``*_id`` column, nested
+    serializers recursively and ISO datetimes formatted in place. Anything
+    else goes through the field's own ``get_attribute``/``to_representation``,
+    so the output matches DRF's exactly.
+    """
+    compiled_representation = True
+
+    def to_representation(self, instance):
+        if not self.compiled_representation or not isinstance(instance, models.Model):
+            return super().to_representation(instance)
+        plan = self.__dict__.get('_representation_plan')
+        if plan is None:
+            plan = self._representation_plan = _compile_plan(self)
+        return _represent(plan, instance)
+
+
+def _represent(plan, instance):
+    ret = {}
+    for name, getter, convert, nested in plan:
+        value = getter(instance)
+        if value is _SKIP:
+            continue
+        if value is None:
+            ret[name] = None
+        elif nested is not None:
+            ret[name] = _represent(nested, value)
+        elif convert is not None:
+            ret[name] = convert(value)
+        else:
+            ret[name] = value
+    return ret
+
+
+def _compile_plan(serializer):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    return [(field.field_name, *_compile_field(field, model)) for field in serializer._readable_fields]
+
+
+def _compile_field(field, model):
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name), None, None
+    model_field = None
+    if model is not None and field.source != '*' and '.' not in field.source:
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            pass
+    if model_field is None or model_field.many_to_many or model_field.one_to_many:
+        return _generic_step(field), None, None
+    if isinstance(field, serializers.Serializer) and not isinstance(field, serializers.ListSerializer):
+        if not isinstance(field, CompiledRepresentationMixin) and type(field).to_representation is not serializers.Serializer.to_representation:
+            return _generic_step(field), None, None
+        return _related_getter(field.source), None, _compile_plan(field)
+    if (isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+            and field.use_pk_only_optimization() and model_field.many_to_one):
+        return attrgetter(model_field.attname), None, None
+    if model_field.is_relation:
+        return _generic_step(field), None, None
+    if type(field) is serializers.IntegerField:
+        return attrgetter(field.source), int, None
+    if type(field) is serializers.CharField:
+        return attrgetter(field.source), str, None
+    if type(field) is serializers.DateTimeField:
+        return attrgetter(field.source), _datetime_converter(field), None
+    if type(field) in (serializers.FileField, serializers.ImageField):
+        return attrgetter(field.source), _file_converter(field), None
+    return _generic_step(field), None, None
+
+
+def _related_getter(source):
+    def get(instance):
+        try:
+            return getattr(instance, source)
+        except ObjectDoesNotExist:
+            return None
+    return get
+
+
+def _generic_step(field):
+    def step(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+    return step
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone') or not settings.USE_TZ:
+        return field.to_representation
+    # Same as DateTimeField.to_representation for aware values, with the zone looked up once.
+    zone = timezone.get_current_timezone()
+
+    def convert(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(zone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _file_converter(field):
+    # URLs depend only on the name (and the request, fixed for this plan).
+    urls = {}
+
+    def convert(value):
+        name = value.name
+        if name not in urls:
+            urls[name] = field.to_representation(value)
+        return urls[name]
+    return convert
+
 
-class CategorySerializer(serializers.ModelSerializer):
+def _split_names(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def _collect_related_paths(serializer, prefix=''):
+    select, prefetch = set(), set()
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        path = prefix + field.source.replace('.', '__')
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            prefetch.add(path)
+            child = getattr(field, 'child', None)
+            if isinstance(child, serializers.Serializer):
+                child_select, child_prefetch = _collect_related_paths(child, path + '__')
+                prefetch.update(child_select | child_prefetch)
+        elif isinstance(field, serializers.Serializer):
+            select.add(path)
+            child_select, child_prefetch = _collect_related_paths(field, path + '__')
+            select.update(child_select)
+            prefetch.update(child_prefetch)
+        elif isinstance(field, serializers.RelatedField) and not field.use_pk_only_optimization():
+            select.add(path)
+    return select, prefetch
+
+
+def _collect_only_paths(serializer, model, prefix=''):
+    """Column paths for ``.only()``, or None when a field's needs are unknown."""
+    paths = set()
+    method_sources = getattr(serializer, 'method_field_sources', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in method_sources:
+                return None
+            paths.update(prefix + source for source in method_sources[name])
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            continue
+        if isinstance(field, serializers.Serializer):
+            nested = _collect_only_paths(field, model_field.related_model, f'{prefix}{field.source}__')
+            if nested is None:
+                return None
+            paths.add(prefix + field.source)
+            paths.update(nested or {f'{prefix}{field.source}__pk'})
+        else:
+            paths.add(prefix + field.source)
+    return paths
+
+
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']
 
-class DistrictSerializer(serializers.ModelSerializer):
+class DistrictSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = District
         fields = ['id', 'name']
 
-class AreaSerializer(serializers.ModelSerializer):
+class AreaSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     district = DistrictSerializer(read_only=True)
     district_id = serializers.PrimaryKeyRelatedField(queryset=District.objects.all(), source='district', write_only=True)
 
@@ -21,18 +278,121 @@ class AreaSerializer(serializers.ModelSerializer):
         model = Area
         fields = ['id', 'name', 'district', 'district_id']
 
-class NewsSerializer(serializers.ModelSerializer):
+class NewsSerializer(CompiledRepresentationMixin, SparseFieldsetMixin, EagerLoadingMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     area = AreaSerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True)
     area_id = serializers.PrimaryKeyRelatedField(queryset=Area.objects.all(), source='area', write_only=True)
     image = serializers.ImageField(required=False, allow_null=True)
+    srcset = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
 
     class Meta:
         model = News
-        fields = ['id', 'title', 'content', 'image', 'category', 'area', 'category_id', 'area_id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'content', 'image', 'srcset', 'category', 'area', 'category_id', 'area_id', 'comment_count', 'created_at', 'updated_at']
+
+    restrict_columns = True
+    method_field_sources = {
+        'srcset': ('image_hash', 'image_width'),
+        'comment_count': (),
+    }
+
+    @extend_schema_field(serializers.IntegerField())
+    def get_comment_count(self, obj):
+        # Views annotate this from the counters table; fall back for bare instances.
+        if hasattr(obj, 'comment_count'):
+            return obj.comment_count
+        return counters.get_count('comment.news', obj.pk) if obj.pk else 0
+
+    @extend_schema_field(serializers.DictField(child=serializers.CharField()))
+    def get_srcset(self, obj):
+        request = self.context.get('request')
+        return build_srcset(obj.image_hash, obj.image_width, request.build_absolute_uri if request else None)
+
+class NewsCompactSerializer(NewsSerializer):
+    """
+    Feed representation: relation ids instead of nested objects and a short
+    ``excerpt`` cut in the database, so ``content`` is never fetched.
+    """
+    EXCERPT_LENGTH = 200
+
+    category = serializers.PrimaryKeyRelatedField(read_only=True)
+    area = serializers.PrimaryKeyRelatedField(read_only=True)
+    district = serializers.PrimaryKeyRelatedField(read_only=True)
+    excerpt = serializers.SerializerMethodField()
+
+    class Meta(NewsSerializer.Meta):
+        fields = ['id', 'title', 'excerpt', 'image', 'srcset', 'category', 'area', 'district', 'comment_count', 'created_at', 'updated_at']
+
+    method_field_sources = {
+        **NewsSerializer.method_field_sources,
+        'excerpt': (),
+    }
+
+    def annotate_queryset(self, queryset):
+        if 'excerpt' in self.fields:
+            # One extra character tells whether the text was cut.
+            queryset = queryset.annotate(content_head=Substr('content', 1, self.EXCERPT_LENGTH + 1))
+        return queryset
+
+    @extend_schema_field(serializers.CharField())
+    def get_excerpt(self, obj):
+        head = obj.content_head if hasattr(obj, 'content_head') else obj.content[:self.EXCERPT_LENGTH + 1]
+        if len(head) <= self.EXCERPT_LENGTH:
+            return head
+        return head[:self.EXCERPT_LENGTH].rsplit(' ', 1)[0].rstrip() + '…'
+
+class NewsExportSerializer(CompiledRepresentationMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    """Flat archive rows: related names are plain columns so CSV needs no flattening."""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    area_name = serializers.CharField(source='area.name', read_only=True)
+    district_name = serializers.CharField(source='district.name', read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = News
+        fields = [
+            'id', 'title', 'content', 'image', 'category', 'category_name', 'area', 'area_name',
+            'district', 'district_name', 'comment_count', 'created_at', 'updated_at',
+        ]
+
+    select_related_fields = ('category', 'area', 'district')
+
+class NewsEventSerializer(serializers.ModelSerializer):
+    """Payload of /api/news/live/ events: enough to place a story in a feed and fetch it."""
+    class Meta:
+        model = News
+        fields = ['id', 'title', 'category', 'area', 'district', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class NewsBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One item of a bulk write. Relation ids are checked against the sets
+    resolved once for the whole batch (``category_ids`` / ``area_ids`` in the
+    context) instead of a lookup per item.
+    """
+    id = serializers.IntegerField(required=False)
+    op = serializers.ChoiceField(choices=['create', 'update', 'delete'], required=False)
+    category_id = serializers.IntegerField()
+    area_id = serializers.IntegerField()
+
+    class Meta:
+        model = News
+        fields = ['id', 'op', 'title', 'content', 'category_id', 'area_id']
+
+    def _check_pk(self, value, ids):
+        if value not in self.context[ids]:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return value
+
+    def validate_category_id(self, value):
+        return self._check_pk(value, 'category_ids')
+
+    def validate_area_id(self, value):
+        return self._check_pk(value, 'area_ids')
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     class Meta:
         model = Comment
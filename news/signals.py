@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import counters, images, live
+from .authentication import user_cache
+from .cache import bump_generation
+from .reference import reference_bundle
+from .models import Category, District, Area, News, Comment, User
+from .search import get_search_backend
+
+_batched_deletes = ContextVar('news_batched_deletes', default=False)
+
+
+@contextmanager
+def batched_deletes():
+    """
+    News and comment deletes inside are accounted for by the caller
+    (news.bulk), so their per-row ``post_delete`` receivers do nothing.
+    """
+    token = _batched_deletes.set(True)
+    try:
+        yield
+    finally:
+        _batched_deletes.reset(token)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'NEWS_SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_save, sender=News)
+def index_news(sender, instance, using, **kwargs):
+    get_search_backend(using).index_news(instance.pk)
+
+
+@receiver(post_delete, sender=News)
+def unindex_news(sender, instance, using, **kwargs):
+    if not _batched_deletes.get():
+        get_search_backend(using).remove(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_news(sender, instance, using, created, **kwargs):
+    if not created:
+        get_search_backend(using).index_category(instance.pk)
+
+
+@receiver(post_save, sender=Area)
+def reindex_area_news(sender, instance, using, created, **kwargs):
+    if not created:
+        get_search_backend(using).index_area(instance.pk)
+
+
+@receiver(post_save, sender=District)
+def reindex_district_news(sender, instance, using, created, **kwargs):
+    if not created:
+        get_search_backend(using).index_district(instance.pk)
+
+
+def bump_after_commit(*names, using=None):
+    # Bumping inside the transaction would let a concurrent miss cache the
+    # still-committed old rows under the new generation.
+    transaction.on_commit(lambda: bump_generation(*names), using=using)
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_news_responses(sender, instance, using, **kwargs):
+    if not _batched_deletes.get():
+        bump_after_commit('news', f'news:{instance.pk}', using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_news_responses(sender, instance, using, **kwargs):
+    # News representations carry comment_count.
+    if not _batched_deletes.get():
+        bump_after_commit('news', f'news:{instance.news_id}', using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def invalidate_reference_responses(sender, instance, using, **kwargs):
+    bump_after_commit(sender._meta.model_name, using=using)
+    # Rebuild now so the next /api/reference/ request is served from memory.
+    transaction.on_commit(reference_bundle.refresh, using=using, robust=True)
+
+
+def _news_counter_keys(news):
+    return counters.news_counter_keys(news.category_id, news.area_id, news.district_id)
+
+
+@receiver(pre_save, sender=News)
+def copy_area_district(sender, instance, raw, **kwargs):
+    if not raw and instance.area_id is not None:
+        instance.district_id = instance.area.district_id
+
+
+@receiver(pre_save, sender=News)
+def remember_previous_news(sender, instance, using, raw, **kwargs):
+    instance._previous_counter_keys = None
+    instance._previous_image = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = News.objects.using(using).filter(pk=instance.pk).values_list(
+        'category_id', 'area_id', 'district_id', 'image',
+    ).first()
+    if previous:
+        instance._previous_counter_keys = counters.news_counter_keys(*previous[:3])
+        instance._previous_image = previous[3]
+
+
+@receiver(pre_save, sender=News)
+def inspect_news_image(sender, instance, raw, **kwargs):
+    image = instance.image
+    instance._image_changed = False
+    if raw:
+        return
+    if not image:
+        instance.image_hash, instance.image_width = '', None
+        return
+    if image._committed and instance.image_hash and image.name == getattr(instance, '_previous_image', None):
+        return
+    instance.image_hash, instance.image_width = images.inspect_image(image)
+    instance._image_changed = bool(instance.image_hash)
+
+
+@receiver(post_save, sender=News)
+def render_news_image_derivatives(sender, instance, raw, **kwargs):
+    if raw or not getattr(instance, '_image_changed', False) or not settings.NEWS_IMAGE_EAGER:
+        return
+    name, digest, width = instance.image.name, instance.image_hash, instance.image_width
+    transaction.on_commit(lambda: images.schedule_derivatives(name, digest, width))
+
+
+@receiver(post_save, sender=News)
+def publish_live_news(sender, instance, using, created, raw, **kwargs):
+    if not raw:
+        live.publish_news(instance, 'created' if created else 'updated', using=using)
+
+
+@receiver(post_save, sender=News)
+def count_saved_news(sender, instance, using, created, raw, **kwargs):
+    if raw:
+        return
+    current = _news_counter_keys(instance)
+    previous = [] if created else getattr(instance, '_previous_counter_keys', None) or current
+    for name, key in previous:
+        if (name, key) not in current:
+            counters.increment(name, key, -1, using=using)
+    for name, key in current:
+        if (name, key) not in previous:
+            counters.increment(name, key, 1, using=using)
+
+
+@receiver(post_delete, sender=News)
+def count_deleted_news(sender, instance, using, **kwargs):
+    if _batched_deletes.get():
+        return
+    for name, key in _news_counter_keys(instance):
+        counters.increment(name, key, -1, using=using)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, using, created, raw, **kwargs):
+    if created and not raw:
+        counters.increment('comment', using=using)
+        counters.increment('comment.news', instance.news_id, using=using)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, using, **kwargs):
+    if _batched_deletes.get():
+        return
+    counters.increment('comment', delta=-1, using=using)
+    counters.increment('comment.news', instance.news_id, -1, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_revision(sender, instance, using, raw=False, **kwargs):
+    if not raw and not _batched_deletes.get():
+        counters.increment(counters.COMMENT_REVISION, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def bump_reference_revision(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        counters.increment(counters.REFERENCE_REVISION, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Area)
+def count_saved_reference(sender, instance, using, created, raw, **kwargs):
+    if created and not raw:
+        counters.increment(sender._meta.model_name, using=using)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Area)
+def count_deleted_reference(sender, instance, using, **kwargs):
+    counters.increment(sender._meta.model_name, delta=-1, using=using)
+
+
+@receiver(pre_save, sender=Area)
+def remember_area_district(sender, instance, using, raw, **kwargs):
+    instance._previous_district_id = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._previous_district_id = Area.objects.using(using).filter(
+            pk=instance.pk,
+        ).values_list('district_id', flat=True).first()
+
+
+@receiver(post_save, sender=Area)
+def move_area_district_counts(sender, instance, using, created, raw, **kwargs):
+    previous = getattr(instance, '_previous_district_id', None)
+    if created or raw or previous is None or previous == instance.district_id:
+        return
+    News.objects.using(using).filter(area=instance).update(district_id=instance.district_id)
+    moved = counters.get_count('news.area', instance.pk, using=using)
+    counters.increment('news.district', previous, -moved, using=using)
+    counters.increment('news.district', instance.district_id, moved, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate_user(instance.pk)
@@ -1,3 +1,1148 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import OperationalError, connection
+from django.db.backends.utils import CursorWrapper
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from PIL import Image as PILImage
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import benchmarks, bulk, compression, counters, images, live, replicas, schema
+from .authentication import user_cache
+from .instrumentation import metrics
+from .cache import get_generations, get_response_cache
+from .reference import reference_bundle
+from .schema import schema_store
+from .models import Category, District, Area, News, Comment, User, Counter
+from .serializers import NewsSerializer, NewsCompactSerializer, NewsExportSerializer
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from drf_spectacular.views import SpectacularAPIView
+from .urls import router
+from .views import NewsViewSet
 
 # Create your tests here.
+
+def committed():
+    """Run the on_commit callbacks (cache invalidation, live feed) of the writes inside."""
+    return TestCase.captureOnCommitCallbacks(execute=True)
+
+
+def make_rows(count, suffix=''):
+    user, _ = User.objects.get_or_create(username='reader')
+    with committed():
+        for i in range(count):
+            district = District.objects.create(name=f'District {suffix}{i}')
+            area = Area.objects.create(name=f'Area {suffix}{i}', district=district)
+            category = Category.objects.create(name=f'Category {suffix}{i}')
+            news = News.objects.create(title=f'Title {suffix}{i}', content='Body', category=category, area=area)
+            Comment.objects.create(news=news, user=user, content='Nice')
+
+
+class QueryCountGuardTests(TestCase):
+    """Every registered list endpoint must issue a constant number of queries."""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def test_list_endpoints_do_not_scale_with_result_size(self):
+        make_rows(2, 'a')
+        small = {
+            basename: self.count_queries(reverse(f'{basename}-list'))
+            for _, _, basename in router.registry
+        }
+        make_rows(10, 'b')
+        for _, _, basename in router.registry:
+            url = reverse(f'{basename}-list')
+            self.assertEqual(self.count_queries(url), small[basename], f'{url} grows with result size')
+
+    def test_news_detail_uses_single_query(self):
+        make_rows(1)
+        news = News.objects.get()
+        self.assertEqual(self.count_queries(reverse('news-detail', args=[news.pk])), 1)
+
+
+class CursorPaginationTests(TestCase):
+    def test_news_pages_walk_every_row_once(self):
+        make_rows(7)
+        seen = []
+        url = reverse('news-list') + '?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [item['id'] for item in data['results']]
+            url = data['next']
+        expected = list(News.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_comments_are_paginated(self):
+        make_rows(3)
+        data = self.client.get(reverse('comment-list') + '?page_size=2').json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        district = District.objects.create(name='Northville')
+        self.area = Area.objects.create(name='Uptown', district=district)
+        self.category = Category.objects.create(name='Sports')
+
+    def add(self, title, content):
+        return News.objects.create(title=title, content=content, category=self.category, area=self.area)
+
+    def search(self, query):
+        data = self.client.get(reverse('news-list'), {'search': query}).json()
+        return [item['id'] for item in data['results']]
+
+    def test_title_matches_rank_above_content_matches(self):
+        body = self.add('Weekly roundup', 'The marathon was held downtown.')
+        title = self.add('Marathon results', 'Runners finished early.')
+        self.assertEqual(self.search('marathon'), [title.pk, body.pk])
+
+    def test_prefix_and_relation_names_match(self):
+        news = self.add('Election results', 'Counting finished.')
+        self.assertEqual(self.search('elect'), [news.pk])
+        self.assertEqual(self.search('northv'), [news.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        news = self.add('Budget approved', 'Council vote.')
+        news.title = 'Budget rejected'
+        news.save()
+        self.assertEqual(self.search('rejected'), [news.pk])
+        self.assertEqual(self.search('approved'), [])
+        self.category.name = 'Finance'
+        self.category.save()
+        self.assertEqual(self.search('finance'), [news.pk])
+        news.delete()
+        self.assertEqual(self.search('budget'), [])
+
+    def test_ranked_results_paginate(self):
+        ids = {self.add(f'Match {i}', 'match ' * i).pk for i in range(5)}
+        seen = []
+        url = reverse('news-list') + '?search=match&page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            seen += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(seen), sorted(ids))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.first, self.second = News.objects.order_by('id')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, len(ctx.captured_queries)
+
+    def test_repeat_list_is_served_without_queries(self):
+        url = reverse('news-list')
+        miss, _ = self.get(url, category=self.first.category_id, district='')
+        hit, queries = self.get(url, district='', category=self.first.category_id)
+        self.assertEqual(miss['X-Cache'], 'MISS')
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(hit.content, miss.content)
+
+    def test_replica_reads_are_not_stored(self):
+        url = reverse('news-list')
+        with mock.patch('news.replicas.reading_from_replica', return_value=True):
+            self.assertEqual([self.get(url)[0]['X-Cache'] for _ in range(2)], ['MISS', 'MISS'])
+        self.assertEqual([self.get(url)[0]['X-Cache'] for _ in range(2)], ['MISS', 'HIT'])
+
+    def test_saving_news_invalidates_list_and_only_its_detail(self):
+        list_url = reverse('news-list')
+        first_url = reverse('news-detail', args=[self.first.pk])
+        second_url = reverse('news-detail', args=[self.second.pk])
+        for url in (list_url, first_url, second_url):
+            self.get(url)
+        self.first.title = 'Changed'
+        with committed():
+            self.first.save()
+        self.assertEqual(self.get(list_url)[0]['X-Cache'], 'MISS')
+        response, _ = self.get(first_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['title'], 'Changed')
+        self.assertEqual(self.get(second_url)[0]['X-Cache'], 'HIT')
+
+    def test_generation_is_bumped_only_after_commit(self):
+        before = get_generations('news')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.first.save()
+            self.assertEqual(get_generations('news'), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generations('news'), before)
+
+    def test_padded_detail_url_is_invalidated(self):
+        url = f"{reverse('news-list')}0{self.first.pk}/"
+        self.get(url)
+        self.first.title = 'Changed'
+        with committed():
+            self.first.save()
+        response, _ = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['title'], 'Changed')
+
+    def test_renaming_a_district_invalidates_details(self):
+        url = reverse('news-detail', args=[self.first.pk])
+        self.get(url)
+        district = self.first.area.district
+        district.name = 'Renamed'
+        with committed():
+            district.save()
+        response, _ = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['area']['district']['name'], 'Renamed')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.news = News.objects.order_by('id').first()
+        self.detail = reverse('news-detail', args=[self.news.pk])
+        self.list = reverse('news-list')
+
+    def revalidate(self, url, **headers):
+        # Skip the response cache so the view itself answers.
+        with mock.patch.object(NewsViewSet, 'cached_response', lambda view, handler: handler()):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, **headers)
+        return response, len(ctx.captured_queries)
+
+    def test_detail_and_list_answer_304_before_serializing(self):
+        for url, queries in ((self.detail, 1), (self.list, 1)):
+            first = self.client.get(url)
+            self.assertTrue(first['ETag'].startswith('W/"'))
+            response, count = self.revalidate(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertEqual(count, queries, url)
+            self.assertNotIn('Last-Modified', first)
+
+    def test_cached_responses_revalidate_without_queries(self):
+        etag = self.client.get(self.list)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.list, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(ctx.captured_queries)), (304, 0))
+
+    def test_validators_change_with_updates_comments_and_filters(self):
+        etag = self.client.get(self.detail)['ETag']
+        list_etag = self.client.get(self.list)['ETag']
+        self.assertNotEqual(self.client.get(self.list, {'category': self.news.category_id})['ETag'], list_etag)
+        with committed():
+            Comment.objects.create(news=self.news, user=User.objects.get(username='reader'), content='More')
+        self.assertEqual(self.revalidate(self.detail, HTTP_IF_NONE_MATCH=etag)[0].status_code, 200)
+        etag = self.client.get(self.detail)['ETag']
+        self.news.title = 'Edited'
+        with committed():
+            self.news.save()
+        self.assertEqual(self.revalidate(self.detail, HTTP_IF_NONE_MATCH=etag)[0].status_code, 200)
+        self.assertEqual(self.revalidate(self.list, HTTP_IF_NONE_MATCH=list_etag)[0].status_code, 200)
+
+    def test_validators_survive_another_worker_and_follow_reference_edits(self):
+        etags = [self.client.get(url)['ETag'] for url in (self.detail, self.list)]
+        # A fresh cache stands in for another worker or a restart.
+        get_response_cache().clear()
+        self.assertEqual([self.client.get(url)['ETag'] for url in (self.detail, self.list)], etags)
+        category = self.news.category
+        category.name = 'Renamed'
+        with committed():
+            category.save()
+        for url, etag in zip((self.detail, self.list), etags):
+            self.assertEqual(self.revalidate(url, HTTP_IF_NONE_MATCH=etag)[0].status_code, 200, url)
+
+    def test_if_modified_since_alone_never_answers_304(self):
+        # updated_at does not move on any of these writes.
+        since = http_date(time.time() + 3600)
+        user = User.objects.get(username='reader')
+        category = self.news.category
+        category.name = 'Renamed'
+        writes = [
+            lambda: News.objects.exclude(pk=self.news.pk).delete(),
+            lambda: Comment.objects.create(news=self.news, user=user, content='Later'),
+            category.save,
+        ]
+        for write in writes:
+            with committed():
+                write()
+            for url in (self.detail, self.list):
+                response, _ = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, 200, url)
+
+    def test_sparse_detail_still_loads_validator_column(self):
+        url = f'{self.detail}?fields=id,title'
+        response, count = self.revalidate(url)
+        self.assertEqual(count, 1)
+        self.assertIn('ETag', response)
+
+
+class CounterTests(TestCase):
+    def count(self, basename, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse(f'{basename}-count'), params).json()
+        return data['count'], len(ctx.captured_queries)
+
+    def test_counts_follow_creates_moves_and_deletes(self):
+        make_rows(3)
+        news = News.objects.order_by('id').first()
+        old_category, old_district = news.category_id, news.area.district_id
+        self.assertEqual(self.count('news'), (3, 1))
+        self.assertEqual(self.count('news', category=old_category), (1, 1))
+        self.assertEqual(self.count('comment', news=news.pk), (1, 1))
+        self.assertEqual(self.count('category')[0], 3)
+        self.assertEqual(self.count('area')[0], 3)
+
+        news.area = Area.objects.exclude(district_id=old_district).first()
+        news.save()
+        self.assertEqual(self.count('news', district=old_district)[0], 0)
+        self.assertEqual(self.count('news', district=news.area.district_id)[0], 2)
+
+        news.category.delete()
+        self.assertEqual(self.count('news')[0], 2)
+        self.assertEqual(self.count('comment')[0], 2)
+        self.assertEqual(self.count('category')[0], 2)
+
+    def test_combined_filters_fall_back_to_queryset(self):
+        make_rows(2)
+        news = News.objects.first()
+        count, _ = self.count('news', category=news.category_id, district=news.area.district_id)
+        self.assertEqual(count, 1)
+
+    def test_rebuild_matches_maintained_values(self):
+        make_rows(3)
+        maintained = set(Counter.objects.values_list('name', 'key', 'value'))
+        counters.rebuild()
+        self.assertEqual(set(Counter.objects.filter(value__gt=0).values_list('name', 'key', 'value')),
+                         {row for row in maintained if row[2] > 0})
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='cached', password='secret-pass-123')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+
+    def test_repeat_requests_skip_user_lookup(self):
+        url = reverse('user-info')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.json()['username'], 'cached')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_deactivation_evicts_cached_user(self):
+        url = reverse('user-info')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+    def test_cache_is_bounded(self):
+        with self.settings(NEWS_AUTH_CACHE_SIZE=2):
+            for _ in range(3):
+                token = RefreshToken.for_user(self.user).access_token
+                user_cache.set(str(token), token, self.user)
+            self.assertEqual(len(user_cache), 2)
+
+
+@override_settings(NEWS_IMAGE_EAGER=False, NEWS_IMAGE_WIDTHS=(40, 80), NEWS_IMAGE_FORMATS=('webp', 'jpg'))
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        make_rows(1)
+        buffer = BytesIO()
+        PILImage.new('RGBA', (100, 50), (255, 0, 0, 128)).save(buffer, 'PNG')
+        self.news = News.objects.get()
+        self.news.image = SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+        self.news.save()
+
+    def test_upload_records_hash_and_srcset(self):
+        self.assertEqual(len(self.news.image_hash), 64)
+        self.assertEqual(self.news.image_width, 100)
+        srcset = self.client.get(reverse('news-detail', args=[self.news.pk])).json()['srcset']
+        self.assertEqual(list(srcset), ['webp', 'jpg'])
+        self.assertIn(f'/media/derived/{self.news.image_hash[:2]}/{self.news.image_hash}/40w.webp 40w', srcset['webp'])
+        self.assertTrue(srcset['jpg'].endswith('80w.jpg 80w'))
+
+    def test_derivative_is_rendered_on_first_request(self):
+        digest = self.news.image_hash
+        response = self.client.get(f'/media/derived/{digest[:2]}/{digest}/40w.webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with PILImage.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (40, 20))
+        self.assertEqual(self.client.get(f'/media/derived/{digest[:2]}/{digest}/50w.webp').status_code, 404)
+
+    def test_generate_all_derivatives(self):
+        paths = images.generate_derivatives(self.news.image.name, self.news.image_hash, self.news.image_width)
+        self.assertEqual(len(paths), 4)
+
+    def test_concurrent_first_requests_render_and_store_once(self):
+        args = (self.news.image.name, self.news.image_hash, 40, 'jpg')
+        with mock.patch.object(images, 'render_derivative', wraps=images.render_derivative) as render:
+            with ThreadPoolExecutor(4) as pool:
+                paths = set(pool.map(lambda _: images.generate_derivative(*args), range(8)))
+        self.assertEqual(render.call_count, 1)
+        path, = paths
+        # A racing writer from another process overwrites in place instead of adding a copy.
+        images.store_derivative(path, b'same bytes')
+        directory = os.path.dirname(default_storage.path(path))
+        self.assertEqual(os.listdir(directory), [os.path.basename(path)])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media_root, 'news_images'))
+        with open(os.path.join(self.media_root, 'news_images', 'a.jpg'), 'wb') as file:
+            file.write(b'0123456789')
+
+    def test_full_response_has_strong_etag(self):
+        response = self.client.get('/media/news_images/a.jpg')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertFalse(response['ETag'].startswith('W/'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        again = self.client.get('/media/news_images/a.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_only_derivative_paths_are_immutable(self):
+        names = ['IMG_20240101123456.jpg', '3f2b8c1e9a7d4b6f8e0c1a2b3c4d5e6f.jpg']
+        for name in names:
+            with open(os.path.join(self.media_root, 'news_images', name), 'wb') as file:
+                file.write(b'0123456789')
+            response = self.client.get(f'/media/news_images/{name}')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=3600', name)
+
+    def test_byte_ranges(self):
+        response = self.client.get('/media/news_images/a.jpg', HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        suffix = self.client.get('/media/news_images/a.jpg', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(suffix.streaming_content), b'789')
+        self.assertEqual(self.client.get('/media/news_images/a.jpg', HTTP_RANGE='bytes=20-').status_code, 416)
+
+    @override_settings(NEWS_MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_accel_redirect_hands_off_delivery(self):
+        response = self.client.get('/media/news_images/a.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/news_images/a.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_missing_and_escaping_paths_are_404(self):
+        self.assertEqual(self.client.get('/media/news_images/missing.jpg').status_code, 404)
+        self.assertIn(self.client.get('/media/news_images/../../config/settings.py').status_code, (400, 404))
+
+
+class SeedDataTests(TestCase):
+    def test_bulk_seed_keeps_derived_data_consistent(self):
+        call_command('seed_data', news=30, comments=12, users=4, seed=1, batch_size=7, stdout=StringIO())
+        self.assertEqual(News.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 12)
+        self.assertEqual(User.objects.filter(role='user').count(), 5)
+        self.assertEqual(counters.get_count('news'), 30)
+        self.assertEqual(counters.get_count('comment'), 12)
+        news = News.objects.first()
+        results = self.client.get(reverse('news-list'), {'search': news.title}).json()['results']
+        self.assertIn(news.pk, [item['id'] for item in results])
+
+    def test_same_seed_gives_same_rows(self):
+        rows = []
+        for _ in range(2):
+            call_command('seed_data', news=10, seed=5, batch_size=4, stdout=StringIO())
+            rows.append(list(News.objects.order_by('id').values_list('title', 'category__name', 'area__name')))
+        self.assertEqual(rows[0], rows[1])
+
+
+class BenchmarkBudgetTests(TestCase):
+    def test_scenarios_stay_within_query_budgets(self):
+        call_command('seed_data', news=40, comments=40, users=2, seed=3, stdout=StringIO())
+        results = benchmarks.run(iterations=1)
+        self.assertEqual(set(results), {scenario.name for scenario in benchmarks.SCENARIOS})
+        self.assertEqual(benchmarks.check(results, latency=False), [])
+
+    def test_check_reports_regressions_against_baseline(self):
+        scenario = benchmarks.Scenario('demo', '/api/news/', max_queries=2, p95_ms=50)
+        results = {'demo': {'queries': 2, 'p95_ms': 30.0}}
+        baseline = {'demo': {'queries': 1, 'p95_ms': 10.0}}
+        failures = benchmarks.check(results, [scenario], baseline, tolerance=0.5)
+        self.assertEqual(len(failures), 2)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.news = News.objects.order_by('id').first()
+        for i in range(4):
+            user = User.objects.create(username=f'commenter{i}')
+            Comment.objects.create(news=self.news, user=user, content=f'Comment {i}')
+
+    def test_thread_pages_in_constant_queries(self):
+        url = reverse('news-comments', args=[self.news.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {'page_size': 3}).json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([item['user'] for item in data['results']], ['commenter3', 'commenter2', 'commenter1'])
+        rest = self.client.get(data['next']).json()
+        self.assertEqual([item['user'] for item in rest['results']], ['commenter0', 'reader'])
+        self.assertIsNone(rest['next'])
+
+    def test_unknown_news_is_404(self):
+        self.assertEqual(self.client.get(reverse('news-comments', args=[999999])).status_code, 404)
+
+    def test_list_carries_comment_count(self):
+        url = reverse('news-list')
+        counts = {item['id']: item['comment_count'] for item in self.client.get(url).json()['results']}
+        self.assertEqual(counts[self.news.pk], 5)
+        with committed():
+            Comment.objects.filter(news=self.news).first().delete()
+        counts = {item['id']: item['comment_count'] for item in self.client.get(url).json()['results']}
+        self.assertEqual(counts[self.news.pk], 4)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.news = News.objects.order_by('id').first()
+        self.news.content = 'word ' * 100
+        self.news.save()
+
+    def get_results(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(reverse('news-list'), params).json()
+        return data['results'], ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_fields_and_omit(self):
+        results, sql = self.get_results(fields='id,title')
+        self.assertEqual(set(results[0]), {'id', 'title'})
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('news_category', sql)
+        results, _ = self.get_results(omit='content,area')
+        self.assertNotIn('content', results[0])
+        self.assertNotIn('area', results[0])
+        self.assertIn('category', results[0])
+
+    def test_compact_view_never_reads_content(self):
+        results, sql = self.get_results(view='compact')
+        self.assertNotIn(', "news_news"."content"', sql)
+        self.assertIn('SUBSTR("news_news"."content"', sql)
+        item = {result['id']: result for result in results}[self.news.pk]
+        self.assertEqual(item['category'], self.news.category_id)
+        self.assertEqual(item['district'], self.news.area.district_id)
+        self.assertTrue(item['excerpt'].endswith('…'))
+        self.assertLessEqual(len(item['excerpt']), NewsCompactSerializer.EXCERPT_LENGTH + 1)
+        self.assertNotIn('content', item)
+
+    def test_writes_ignore_fieldsets(self):
+        serializer = NewsSerializer(self.news, context={'request': RequestFactory().put('/?fields=id')})
+        self.assertIn('content', serializer.data)
+
+
+class ReferenceBundleTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        reference_bundle.clear()
+        self.url = reverse('reference')
+
+    def test_bundle_lists_reference_data(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual([c['name'] for c in data['categories']], ['Category 0', 'Category 1'])
+        self.assertEqual(len(data['districts']), 2)
+        self.assertEqual(data['areas'][0]['district']['name'], 'District 0')
+
+    def test_revalidation_and_repeat_requests_skip_the_database(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            repeat = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+    def test_gzip_body_when_accepted(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        refused = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        self.assertFalse(refused.has_header('Content-Encoding'))
+
+    def test_reference_change_rebuilds_bundle(self):
+        etag = self.client.get(self.url)['ETag']
+        with committed():
+            Category.objects.get(name='Category 0').delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Category 0', [c['name'] for c in response.json()['categories']])
+
+
+@override_settings(ROOT_URLCONF='config.asgi_urls')
+class AsyncReadPathTests(TestCase):
+    def setUp(self):
+        make_rows(3)
+        self.news = News.objects.order_by('id').first()
+
+    async def fetch_both(self, url):
+        get_response_cache().clear()
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = await sync_to_async(self.client.get)(url)
+        get_response_cache().clear()
+        return expected, await self.async_client.get(url)
+
+    async def test_reads_match_the_sync_views_without_running_them(self):
+        urls = [
+            '/api/news/', '/api/news/?page_size=1&view=compact', '/api/news/?fields=id,title&search=Title',
+            f'/api/news/{self.news.pk}/', f'/api/news/{self.news.pk}/comments/',
+        ]
+        sync_handlers = {name: mock.DEFAULT for name in ('list', 'retrieve', 'comments')}
+        for url in urls:
+            expected, _ = await self.fetch_both(url)
+            with mock.patch.multiple(NewsViewSet, **sync_handlers) as handlers:
+                get_response_cache().clear()
+                response = await self.async_client.get(url)
+            self.assertFalse(any(handler.called for handler in handlers.values()), url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertEqual(response.has_header('ETag'), expected.has_header('ETag'), url)
+
+    async def test_sparse_pages_keep_the_cursor_column(self):
+        for url in ['/api/news/?fields=id,title&page_size=2', '/api/news/?omit=created_at&page_size=2']:
+            expected, _ = await self.fetch_both(url)
+            get_response_cache().clear()
+            # The ASGI handler runs the ORM on a thread of its own, so count at the cursor.
+            with mock.patch.object(CursorWrapper, 'execute', autospec=True, side_effect=CursorWrapper.execute) as execute:
+                response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertIsNotNone(response.json()['next'], url)
+            # The validator aggregate and the page.
+            self.assertEqual(execute.call_count, 2, url)
+
+    async def test_errors_filters_and_writes_fall_back_to_sync_views(self):
+        for url in ['/api/news/999999/', '/api/news/?cursor=bad', f'/api/news/?category={self.news.category_id}']:
+            expected, response = await self.fetch_both(url)
+            self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content), url)
+        response = await self.async_client.post('/api/news/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        make_rows(4)
+        # Two rows sharing a timestamp exercise the since_id tie-break.
+        News.objects.filter(pk__in=News.objects.order_by('id').values('pk')[:2]).update(
+            updated_at=News.objects.order_by('id').first().updated_at,
+        )
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('news-export'), params)
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return response, body
+
+    def test_ndjson_resumes_from_checkpoint_without_gaps(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row['updated_at'], row['id'])))
+        checkpoint = rows[0]
+        _, rest = self.export(since=checkpoint['updated_at'], since_id=checkpoint['id'])
+        self.assertEqual([json.loads(line)['id'] for line in rest.splitlines()], [row['id'] for row in rows[1:]])
+
+    def test_csv_honours_filters(self):
+        news = News.objects.order_by('id').last()
+        response, body = self.export(format='csv', district=news.area.district_id)
+        header, *rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(header[:3], ['id', 'title', 'content'])
+        self.assertEqual([row[0] for row in rows], [str(news.pk)])
+        self.assertIn('news-export.csv', response['Content-Disposition'])
+
+    def test_invalid_checkpoint_is_rejected(self):
+        for since in ('yesterday', '2024-13-45T00:00:00'):
+            response = self.client.get(reverse('news-export'), {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+            self.assertIn(b'since', response.content)
+
+
+class BulkWriteTests(TestCase):
+    def setUp(self):
+        make_rows(3)
+        self.category, self.other_category = Category.objects.order_by('id')[:2]
+        self.area, _, self.far_area = Area.objects.order_by('id')
+        self.url = reverse('news-bulk')
+
+    def creates(self, count):
+        return [
+            {'title': f'Wire {i}', 'content': 'Story', 'category_id': self.category.pk, 'area_id': self.area.pk}
+            for i in range(count)
+        ]
+
+    def post(self, items, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'{self.url}?atomic={params.get("atomic", "")}', items, content_type='application/json')
+        return response, len(ctx.captured_queries)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        _, small = self.post(self.creates(2))
+        response, large = self.post(self.creates(40))
+        self.assertEqual(response.json()['created'], 40)
+        self.assertEqual(small, large)
+
+    def test_mixed_batch_reports_each_item_and_keeps_derived_data(self):
+        first, second, _ = News.objects.order_by('id')
+        items = self.creates(2) + [
+            {'id': first.pk, 'area_id': self.far_area.pk, 'category_id': self.other_category.pk},
+            {'id': second.pk, 'op': 'delete'},
+            {'title': 'Bad', 'content': 'x', 'category_id': 999, 'area_id': self.area.pk},
+            {'id': first.pk, 'title': 'Twice'},
+        ]
+        response, _ = self.post(items)
+        data = response.json()
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'created', 'updated', 'deleted', 'invalid', 'invalid'])
+        self.assertIn('category_id', data['results'][4]['errors'])
+        first.refresh_from_db()
+        self.assertEqual((first.area_id, first.category_id), (self.far_area.pk, self.other_category.pk))
+        self.assertFalse(News.objects.filter(pk=second.pk).exists())
+        self.assertEqual(len(self.client.get(reverse('news-list'), {'search': 'Wire'}).json()['results']), 2)
+        maintained = {(c.name, c.key): c.value for c in Counter.objects.exclude(value=0)}
+        counters.rebuild()
+        self.assertEqual(maintained, {(c.name, c.key): c.value for c in Counter.objects.all()})
+
+    def test_delete_queries_do_not_grow_with_batch_size(self):
+        user = User.objects.get(username='reader')
+        with committed():
+            for i in range(12):
+                news = News.objects.create(title=f'Old {i}', content='Story', category=self.category, area=self.area)
+                Comment.objects.create(news=news, user=user, content='Nice')
+        doomed = list(News.objects.filter(title__startswith='Old').order_by('id').values_list('pk', flat=True))
+        _, small = self.post([{'id': pk, 'op': 'delete'} for pk in doomed[:2]])
+        response, large = self.post([{'id': pk, 'op': 'delete'} for pk in doomed[2:]])
+        self.assertEqual(response.json()['deleted'], 10)
+        self.assertEqual(small, large)
+        self.assertFalse(News.objects.filter(pk__in=doomed).exists())
+        self.assertFalse(Comment.objects.filter(news_id__in=doomed).exists())
+        self.assertEqual(self.client.get(reverse('news-list'), {'search': 'Old'}).json()['results'], [])
+        maintained = {(c.name, c.key): c.value for c in Counter.objects.exclude(value=0)}
+        counters.rebuild()
+        self.assertEqual(maintained, {(c.name, c.key): c.value for c in Counter.objects.all()})
+
+    def test_cache_generation_is_bumped_only_after_commit(self):
+        news = News.objects.order_by('id').first()
+        before = get_generations('news', f'news:{news.pk}')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.post([{'id': news.pk, 'title': 'Pending'}])
+        self.assertEqual(get_generations('news', f'news:{news.pk}'), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generations('news', f'news:{news.pk}'), before)
+
+    def test_atomic_batch_with_errors_writes_nothing(self):
+        before = News.objects.count()
+        response, _ = self.post(self.creates(2) + [{'title': 'No refs'}], atomic='1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['skipped', 'skipped', 'invalid'])
+        self.assertEqual(News.objects.count(), before)
+
+    def test_ndjson_body(self):
+        body = '\n'.join(json.dumps(item) for item in self.creates(3)) + '\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['created'], 3)
+        bad = self.client.post(self.url, '{"title": ', content_type='application/x-ndjson')
+        self.assertEqual(bad.status_code, 400)
+
+
+class DistrictDenormalizationTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.news = News.objects.order_by('id').first()
+        self.other_district = District.objects.exclude(pk=self.news.district_id).get()
+
+    def test_district_follows_area_on_save_and_area_move(self):
+        self.assertEqual(self.news.district_id, self.news.area.district_id)
+        area = self.news.area
+        area.district = self.other_district
+        area.save()
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.district_id, self.other_district.pk)
+        results = self.client.get(reverse('news-list'), {'district': self.other_district.pk}).json()['results']
+        self.assertIn(self.news.pk, [item['id'] for item in results])
+
+    def test_bulk_update_moves_district(self):
+        far_area = Area.objects.get(district=self.other_district)
+        self.client.post(reverse('news-bulk'), [{'id': self.news.pk, 'area_id': far_area.pk}], content_type='application/json')
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.district_id, self.other_district.pk)
+
+    def test_query_plan_audit_finds_no_full_scans(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('No full scans', out.getvalue())
+
+    def test_query_plan_audit_on_unmigrated_database_asks_for_migrate(self):
+        missing = OperationalError('no such table: news_news')
+        with mock.patch('news.query_plans.audit', side_effect=missing):
+            with self.assertRaisesMessage(CommandError, 'migrate'):
+                call_command('explain_queries', stdout=StringIO())
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_connections_get_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+@override_settings(NEWS_READ_REPLICAS=['replica'], NEWS_REPLICA_STICKY_COOKIE='news_primary')
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        replicas.replica_health.clear()
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+        self.middleware = replicas.ReplicaRoutingMiddleware(self.respond)
+
+    def respond(self, request):
+        self.read_from = self.router.db_for_read(News)
+        return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+    def route(self, method='get', **extra):
+        response = self.middleware(getattr(self.factory, method)('/api/news/', **extra))
+        return self.read_from, response
+
+    @mock.patch.object(replicas, 'replica_lag', return_value=0)
+    def test_reads_use_replica_until_client_writes(self, lag):
+        self.assertEqual(self.route()[0], 'replica')
+        _, response = self.route('post', HTTP_AUTHORIZATION='Bearer abc')
+        self.assertIn('news_primary', response.cookies)
+        self.factory.cookies['news_primary'] = '1'
+        self.assertIsNone(self.route()[0])
+        del self.factory.cookies['news_primary']
+        self.assertIsNone(self.route(HTTP_AUTHORIZATION='Bearer abc')[0])
+        self.assertEqual(self.route(HTTP_AUTHORIZATION='Bearer other')[0], 'replica')
+        self.assertEqual(lag.call_count, 1)
+
+    @mock.patch.object(replicas, 'replica_lag', return_value=60)
+    def test_lagging_replica_falls_back_to_primary(self, lag):
+        self.assertIsNone(self.route()[0])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        get_response_cache().clear()
+        metrics.clear()
+
+    @override_settings(NEWS_INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_profiled_request_reports_server_timing(self):
+        timing = self.client.get(reverse('news-list')).headers['Server-Timing']
+        phases = dict(part.split(';', 1)[0:2] for part in timing.split(', '))
+        self.assertEqual(set(phases), {'db', 'auth', 'serialize', 'render', 'total'})
+        self.assertNotIn('desc="0 queries"', phases['db'])
+
+    def test_unsampled_requests_only_feed_latency_histograms(self):
+        response = self.client.get(reverse('news-list'))
+        self.assertNotIn('Server-Timing', response.headers)
+        staff = User.objects.create_user('ops', is_staff=True)
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(staff).access_token)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('news_request_duration_seconds_count{route="news-list",method="GET"} 1', text)
+        self.assertNotIn('news_request_queries_count{route="news-list"', text)
+
+    @override_settings(NEWS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_sql_without_sampling(self):
+        with self.assertLogs('news.slow_requests', 'WARNING') as logs:
+            response = self.client.get(reverse('news-list'))
+        self.assertIn('SELECT', logs.output[0])
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_metrics_need_staff_without_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        reader = User.objects.get(username='reader')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(reader).access_token)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(NEWS_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class CompiledRepresentationTests(TestCase):
+    def setUp(self):
+        make_rows(3)
+        first, second, _ = News.objects.order_by('id')
+        # update() skips the signal that would inspect the (missing) image file.
+        News.objects.filter(pk__in=[first.pk, second.pk]).update(
+            image='news_images/photo.jpg', image_hash='ab' * 32, image_width=1200,
+        )
+        News.objects.filter(pk=first.pk).update(title='Line\u2028separator, ünïcode')
+        self.request = RequestFactory().get('/api/news/', {'fields': 'id,title,image,srcset,area,created_at'})
+
+    def render_both(self, serializer_class, request):
+        context = {'request': request}
+        queryset = serializer_class(context=context).setup_eager_loading(
+            News.objects.annotate(comment_count=counters.counter_subquery('comment.news')),
+        ).order_by('id')
+        page = list(queryset)
+        drf = serializer_class(page, many=True, context=context)
+        drf.child.compiled_representation = False
+        return JSONRenderer().render(drf.data), FastJSONRenderer().render(serializer_class(page, many=True, context=context).data)
+
+    def test_output_is_byte_identical(self):
+        plain = RequestFactory().get('/api/news/')
+        for serializer_class, request in [
+            (NewsSerializer, plain), (NewsSerializer, self.request),
+            (NewsCompactSerializer, plain), (NewsExportSerializer, plain),
+        ]:
+            with self.subTest(serializer=serializer_class.__name__, query=request.GET.urlencode()):
+                expected, compiled = self.render_both(serializer_class, request)
+                self.assertEqual(compiled, expected)
+        full, _ = self.render_both(NewsSerializer, plain)
+        self.assertIn(b'\\u2028', full)
+        self.assertIn(b'320w', full)
+
+    def test_single_instance_and_nested_none(self):
+        news = News.objects.select_related('category', 'area__district').first()
+        context = {'request': RequestFactory().get('/')}
+        drf = NewsSerializer(news, context=context)
+        drf.compiled_representation = False
+        self.assertEqual(NewsSerializer(news, context=context).data, drf.data)
+        news.area = None
+        self.assertIsNone(NewsSerializer(news, context=context).data['area'])
+
+
+@override_settings(NEWS_COMPRESSION_MIN_SIZE=0)
+class CompressionTests(TestCase):
+    def setUp(self):
+        make_rows(3)
+        get_response_cache().clear()
+
+    def test_negotiation_uses_q_values_then_server_preference(self):
+        def request(accept):
+            return RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        self.assertEqual(compression.negotiate(request('gzip, br'), ['br', 'gzip']), 'br')
+        self.assertEqual(compression.negotiate(request('br;q=0.5, gzip'), ['br', 'gzip']), 'gzip')
+        self.assertEqual(compression.negotiate(request('*'), ['zstd', 'gzip']), 'zstd')
+        self.assertIsNone(compression.negotiate(request('*;q=0, identity'), ['gzip']))
+        self.assertIsNone(compression.negotiate(RequestFactory().get('/'), ['gzip']))
+        self.assertEqual(compression.negotiate(request('zstd, br, gzip;q=0.1')), 'zstd' if compression.zstandard else (
+            'br' if compression.brotli else 'gzip'))
+
+    def test_threshold_and_headers(self):
+        url = reverse('news-detail', args=[News.objects.first().pk])
+        plain = self.client.get(url)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertTrue(compressed['ETag'].startswith('W/'))
+        with override_settings(NEWS_COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            small = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small.content, plain.content)
+
+    def test_cache_hit_serves_stored_compressed_body(self):
+        url = reverse('news-list')
+        miss = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        with mock.patch.object(compression, 'compress', side_effect=AssertionError('recompressed')):
+            hit = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            plain = self.client.get(url)
+        self.assertEqual((miss['X-Cache'], hit['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(hit['Content-Encoding'], 'gzip')
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(gzip.decompress(hit.content), plain.content)
+
+    def test_streaming_export_is_compressed_per_chunk(self):
+        url = reverse('news-export')
+        plain = b''.join(self.client.get(url).streaming_content)
+        with override_settings(NEWS_EXPORT_CHUNK_SIZE=1):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
+
+    @override_settings(NEWS_CODE_VERSION='compression')
+    def test_schema_is_compressed(self):
+        schema_store.clear()
+        self.addCleanup(schema_store.clear)
+        with mock.patch('news.schema.write_artifact'):
+            response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'openapi', gzip.decompress(response.content))
+
+
+class SchemaCacheTests(TestCase):
+    def setUp(self):
+        self.schema_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.schema_dir)
+        override = override_settings(NEWS_SCHEMA_DIR=self.schema_dir, NEWS_CODE_VERSION='v1')
+        override.enable()
+        self.addCleanup(override.disable)
+        schema_store.clear()
+        self.addCleanup(schema_store.clear)
+
+    def test_matches_the_generated_schema_in_every_format(self):
+        for accept in ('application/vnd.oai.openapi', 'application/json'):
+            with self.subTest(accept=accept):
+                request = RequestFactory().get('/api/schema/', HTTP_ACCEPT=accept)
+                expected = SpectacularAPIView.as_view()(request).render()
+                response = self.client.get(reverse('schema'), HTTP_ACCEPT=accept)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response['Content-Type'], expected['Content-Type'])
+
+    def test_generated_once_per_code_version(self):
+        url = reverse('schema')
+        with mock.patch('news.schema.generate_schema', wraps=schema.generate_schema) as generate:
+            etag = self.client.get(url)['ETag']
+            repeat = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(generate.call_count, 1)
+            schema_store.clear()
+            self.assertEqual(self.client.get(url).content, repeat.content)
+            self.assertEqual(generate.call_count, 1)
+            with override_settings(NEWS_CODE_VERSION='v2'):
+                self.client.get(url)
+            self.assertEqual(generate.call_count, 2)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(sorted(os.listdir(self.schema_dir)), ['openapi-v1.yaml', 'openapi-v2.yaml'])
+
+    def test_code_version_defaults_to_a_source_digest(self):
+        with override_settings(NEWS_CODE_VERSION=''):
+            version = schema.code_version()
+            with override_settings(ROOT_URLCONF='config.asgi_urls'):
+                self.assertNotEqual(schema.code_version(), version)
+        self.assertRegex(version, r'^[0-9a-f]{16}$')
+
+    def test_command_writes_artifacts_that_are_served(self):
+        call_command('generate_schema', stdout=StringIO())
+        with open(os.path.join(self.schema_dir, 'openapi-v1.json'), 'w') as artifact:
+            artifact.write('{"openapi": "3.0.3"}')
+        with mock.patch('news.schema.generate_schema') as generate:
+            response = self.client.get(reverse('schema'), HTTP_ACCEPT='application/json')
+        generate.assert_not_called()
+        self.assertEqual(response.content, b'{"openapi": "3.0.3"}')
+
+
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        make_rows(2)
+        self.first, self.second = News.objects.order_by('id')
+        self.url = reverse('news-live')
+        live.hub.clear()
+
+    def save(self, *items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [News.objects.create(title=title, content='Body', category=news.category, area=news.area)
+                    for title, news in items]
+
+    @asynccontextmanager
+    async def connect(self, query='', last_event_id=None):
+        headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+        response = await self.async_client.get(f'{self.url}{query}', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+            yield stream
+        finally:
+            await stream.aclose()
+
+    async def read(self, stream):
+        frame = (await asyncio.wait_for(anext(stream), 5)).decode()
+        fields = dict(line.split(': ', 1) for line in frame.strip().splitlines())
+        return fields.get('event'), json.loads(fields['data'])
+
+    def edit(self, news, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            news.title = title
+            news.save()
+
+    async def test_pushes_matching_events(self):
+        async with self.connect(f'?district={self.first.district_id}') as stream:
+            await sync_to_async(self.save)(('Elsewhere', self.second), ('Local', self.first))
+            kind, data = await self.read(stream)
+            self.assertEqual((kind, data['title'], data['district']), ('created', 'Local', self.first.district_id))
+            await sync_to_async(self.edit)(self.second, 'Other edit')
+            await sync_to_async(self.edit)(self.first, 'Edited')
+            kind, data = await self.read(stream)
+        self.assertEqual((kind, data['id'], data['title']), ('updated', self.first.pk, 'Edited'))
+
+    async def test_resumes_from_last_event_id(self):
+        await sync_to_async(self.save)(('One', self.first), ('Two', self.second), ('Three', self.first))
+        ids = [event.id for event in live.hub.events]
+        async with self.connect(last_event_id=ids[0]) as stream:
+            self.assertEqual([(await self.read(stream))[1]['title'] for _ in range(2)], ['Two', 'Three'])
+        async with self.connect(f'?category={self.first.category_id}', last_event_id=ids[0] - 1) as stream:
+            self.assertEqual([(await self.read(stream))[1]['title'] for _ in range(2)], ['One', 'Three'])
+
+    async def test_resets_when_last_event_id_fell_out_of_the_buffer(self):
+        with mock.patch.object(live, 'hub', live.Hub(2)), mock.patch.object(live, '_broker', None):
+            await sync_to_async(self.save)(('One', self.first), ('Two', self.first), ('Three', self.first))
+            oldest = min(event.id for event in live.hub.events)
+            async with self.connect(last_event_id=oldest - 2) as stream:
+                self.assertEqual(await self.read(stream), ('reset', {}))
+                self.assertEqual((await self.read(stream))[1]['title'], 'Two')
+
+    def test_rejects_bad_filters_and_wsgi(self):
+        self.assertEqual(self.client.get(self.url).status_code, 501)
+        response = async_to_sync(self.async_client.get)(self.url, {'category': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_writes_are_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.bulk_write([
+                {'title': 'Wire', 'content': 'Story', 'category_id': self.first.category_id, 'area_id': self.first.area_id},
+                {'id': self.second.pk, 'title': 'Rewritten'},
+            ])
+        frames = [event.frame.decode() for event in live.hub.events]
+        self.assertIn('event: created', frames[0])
+        self.assertIn('"title":"Wire"', frames[0])
+        self.assertIn('event: updated', frames[1])
+        self.assertIn('"title":"Rewritten"', frames[1])
+
+    def test_fanout_reaches_only_matching_subscribers(self):
+        result = benchmarks.live_fanout(subscribers=20000, events=5)
+        self.assertEqual(result['delivered'], result['expected'])
+        self.assertEqual(result['wakeups_per_event'], 1)
@@ -1,7 +1,10 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import CategoryViewSet, AreaViewSet, NewsViewSet, CommentViewSet, AdminRegisterView, LoginView, DistrictViewSet, UserRegisterView, AdminRegisterView, UserInfoView, LogoutView
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from .views import CategoryViewSet, AreaViewSet, NewsViewSet, CommentViewSet, AdminRegisterView, LoginView, DistrictViewSet, UserRegisterView, AdminRegisterView, UserInfoView, LogoutView, ReferenceDataView, MetricsView
+from .async_views import with_async_reads
+from .live import live_news
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
+from .schema import CachedSchemaView
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
@@ -10,15 +13,21 @@ router.register(r'news', NewsViewSet)
 router.register(r'comments', CommentViewSet)
 router.register(r'districts', DistrictViewSet)
 
-urlpatterns = router.urls
+# Ahead of the router so that 'live' is not taken for a news id.
+urlpatterns = [path('news/live/', live_news, name='news-live')] + router.urls
 
 urlpatterns += [
+    path('reference/', ReferenceDataView.as_view(), name='reference'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('auth/register/user/', UserRegisterView.as_view(), name='register-user'),
     path('auth/register/admin/', AdminRegisterView.as_view(), name='register-admin'),
     path('auth/user/info/', UserInfoView.as_view(), name='user-info'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('schema/', CachedSchemaView.as_view(), name='schema'),
     path('schema/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
+
+# Same routes with the news reads answered asynchronously (config.asgi_urls).
+async_urlpatterns = with_async_reads(urlpatterns)
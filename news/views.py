@@ -1,50 +1,134 @@
+import hmac
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, filters
 from .models import Category, Area, News, Comment, District
-from .serializers import CategorySerializer, AreaSerializer, NewsSerializer, CommentSerializer, UserRegisterSerializer, UserLoginSerializer, AdminRegisterSerializer, DistrictSerializer
+from .serializers import CategorySerializer, AreaSerializer, NewsSerializer, NewsCompactSerializer, NewsExportSerializer, NewsBulkItemSerializer, CommentSerializer, UserRegisterSerializer, UserLoginSerializer, AdminRegisterSerializer, DistrictSerializer
 from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
 from django.contrib.auth import authenticate, login
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils.timezone import now
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework_simplejwt.tokens import RefreshToken
-from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.rest_framework import DjangoFilterBackend, FilterSet, CharFilter
 from django.conf import settings
 from rest_framework.decorators import action
+from .pagination import CreatedAtCursorPagination
+from .search import FullTextSearchFilter
+from .cache import ResponseCacheMixin, ConditionalGetMixin
+from . import counters, images, media
+from .export import NDJSONRenderer, CSVRenderer, after_checkpoint, export_chunk_size
+from .bulk import NDJSONParser, bulk_write
+from rest_framework.parsers import JSONParser
+from drf_spectacular.types import OpenApiTypes
+from .compression import negotiate
+from .reference import ReferenceDataSerializer, reference_bundle
+from .instrumentation import InstrumentedViewMixin, metrics
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
 # Create your views here.
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class EagerLoadingViewMixin:
+    """
+    Applies the select/prefetch paths (and column restrictions) declared by
+    the serializer used for the current request, so nested representations
+    never query per row.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer = self.get_serializer()
+        if hasattr(serializer, 'setup_eager_loading'):
+            queryset = serializer.setup_eager_loading(queryset)
+        return queryset
+
+class CounterCountMixin:
+    """
+    ``count`` action answered from the maintained counters. ``counter_filters``
+    maps a query param to the per-key counter covering it; requests with more
+    than one filter, or with filters no counter covers, fall back to counting
+    the filtered queryset.
+    """
+    counter_name = None
+    counter_filters = {}
+    count_ignored_params = ('format', 'ordering', 'cursor', 'page_size')
+
+    def get_counter_lookup(self):
+        params = {
+            key: value for key, value in self.request.query_params.items()
+            if value and key not in self.count_ignored_params
+        }
+        if not params:
+            return self.counter_name, 0
+        if len(params) == 1:
+            (param, value), = params.items()
+            if param in self.counter_filters and value.isdigit():
+                return self.counter_filters[param], int(value)
+        return None
+
+    @action(detail=False, methods=['get'])
+    def count(self, request):
+        lookup = self.get_counter_lookup()
+        if lookup is None:
+            count = self.filter_queryset(self.get_queryset()).count()
+        else:
+            count = counters.get_count(*lookup, using=self.queryset.db)
+        return Response({'count': count}, status=status.HTTP_200_OK)
+
+class CategoryViewSet(InstrumentedViewMixin, CounterCountMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name']
     ordering_fields = ['name']
+    counter_name = 'category'
 
-    @action(detail=False, methods=['get'])
-    def count(self, request):
-        count = self.queryset.count()
-        return Response({'count': count}, status=status.HTTP_200_OK)
-
-class AreaViewSet(viewsets.ModelViewSet):
+class AreaViewSet(InstrumentedViewMixin, CounterCountMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
     queryset = Area.objects.all()
     serializer_class = AreaSerializer
+    counter_name = 'area'
 
-    @action(detail=False, methods=['get'])
-    def count(self, request):
-        count = self.queryset.count()
-        return Response({'count': count}, status=status.HTTP_200_OK)
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter('fields', str, description='Comma-separated fields to include.'),
+    OpenApiParameter('omit', str, description='Comma-separated fields to leave out.'),
+]
+
+class NewsFilterSet(FilterSet):
+    # Same parameter as before, answered from the denormalized column.
+    area__district__name = CharFilter(field_name='district__name')
 
-class NewsViewSet(viewsets.ModelViewSet):
-    queryset = News.objects.all().order_by('-created_at')
+    class Meta:
+        model = News
+        fields = ['category', 'area__name']
+
+
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS + [
+        OpenApiParameter('view', str, enum=['compact'], description='Compact feed items: relation ids and an excerpt instead of content.'),
+    ]),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
+class NewsViewSet(InstrumentedViewMixin, ResponseCacheMixin, ConditionalGetMixin, CounterCountMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
+    queryset = News.objects.all().order_by('-created_at', '-id')
     serializer_class = NewsSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
-    search_fields = ['title', 'content', 'category__name', 'area__name', 'area__district__name']
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     ordering_fields = ['created_at']
-    filterset_fields = ['category', 'area__name', 'area__district__name']
+    filterset_class = NewsFilterSet
+    # The filterset validates these with a query of its own; see news.async_views.
+    async_fallback_params = NewsFilterSet.Meta.fields + ['area__district__name']
+    counter_name = 'news'
+    counter_filters = {
+        'category': 'news.category',
+        'area': 'news.area',
+        'district': 'news.district',
+    }
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -56,18 +140,97 @@ class NewsViewSet(viewsets.ModelViewSet):
         if area:
             queryset = queryset.filter(area_id=area)
         if district:
-            queryset = queryset.filter(area__district_id=district)
-        return queryset
-    
-    @action(detail=False, methods=['get'])
-    def count(self, request):
-        count = self.queryset.count()
-        return Response({'count': count}, status=status.HTTP_200_OK)
+            queryset = queryset.filter(district_id=district)
+        return queryset.annotate(comment_count=counters.counter_subquery('comment.news'))
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.request.query_params.get('view') == 'compact':
+            return NewsCompactSerializer
+        return super().get_serializer_class()
+
+    @extend_schema(responses=CommentSerializer(many=True))
+    @action(detail=True, methods=['get'], serializer_class=CommentSerializer)
+    def comments(self, request, pk=None):
+        if not str(pk).isdigit():
+            raise Http404
+        page = self.paginate_queryset(self.get_comment_queryset(pk))
+        if not page and not News.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def acomments(self):
+        """Async ``comments``; None when the news does not exist, so the sync view answers the 404."""
+        pk = self.kwargs['pk']
+        if not str(pk).isdigit():
+            return None
+        page = await self.paginator.apaginate_queryset(self.get_comment_queryset(pk), self.request, view=self)
+        if not page and not await News.objects.filter(pk=pk).aexists():
+            return None
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('format', str, enum=['ndjson', 'csv'], description='Defaults to ndjson.'),
+            OpenApiParameter('since', str, description='Only rows updated after this ISO 8601 checkpoint.'),
+            OpenApiParameter('since_id', int, description='Id of the last row stored at `since`; breaks ties.'),
+        ],
+        responses={(200, 'application/x-ndjson'): NewsExportSerializer, (200, 'text/csv'): NewsExportSerializer},
+    )
+    @action(
+        detail=False, methods=['get'], serializer_class=NewsExportSerializer,
+        renderer_classes=[NDJSONRenderer, CSVRenderer], pagination_class=None,
+    )
+    def export(self, request):
+        """Stream the whole archive (or everything after a checkpoint) in ``(updated_at, id)`` order."""
+        queryset = after_checkpoint(self.get_queryset(), request.query_params)
+        serializer = self.get_serializer()
+        rows = (serializer.to_representation(news) for news in queryset.iterator(chunk_size=export_chunk_size()))
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows, list(serializer.fields)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="news-export.{renderer.format}"'
+        return response
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+    @extend_schema(
+        request={'application/json': NewsBulkItemSerializer(many=True), 'application/x-ndjson': NewsBulkItemSerializer},
+        parameters=[OpenApiParameter('atomic', bool, description='Write nothing unless every item is valid.')],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create, update or delete many articles at once. Items without ``id``
+        are created, items with one are updated (``"op": "delete"`` deletes).
+        Returns a result per item, in request order.
+        """
+        atomic = request.query_params.get('atomic', '').lower() in ('1', 'true')
+        results = bulk_write(request.data, atomic=atomic)
+        summary = {
+            status_name: sum(1 for result in results if result['status'] == status_name)
+            for status_name in ('created', 'updated', 'deleted', 'invalid')
+        }
+        code = status.HTTP_400_BAD_REQUEST if atomic and summary['invalid'] else status.HTTP_200_OK
+        return Response({**summary, 'results': results}, status=code)
+
+    def get_comment_queryset(self, pk):
+        return (
+            Comment.objects.filter(news_id=pk)
+            .select_related('user')
+            .only('id', 'news_id', 'content', 'created_at', 'user__id', 'user__username')
+            .order_by('-created_at', '-id')
+        )
+
+class CommentViewSet(InstrumentedViewMixin, CounterCountMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.all().order_by('-created_at', '-id')
     serializer_class = CommentSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
+    counter_name = 'comment'
+    counter_filters = {'news': 'comment.news'}
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -79,12 +242,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(news_id=news_id)
         return queryset
     
-    @action(detail=False, methods=['get'])
-    def count(self, request):
-        count = self.queryset.count()
-        return Response({'count': count}, status=status.HTTP_200_OK)
-
-class DistrictViewSet(viewsets.ModelViewSet):
+class DistrictViewSet(InstrumentedViewMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
     queryset = District.objects.all()
     serializer_class = DistrictSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -206,4 +364,73 @@ class LogoutView(APIView):
             path='/api/auth/refresh/',
         )
 
-        return response
\ No newline at end of file
+        return response
+
+class ReferenceDataView(APIView):
+    """
+    Categories, districts and areas in one response, served from the
+    in-process bundle in news.reference. Revalidation with If-None-Match is
+    answered with 304 without touching the database.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    cache_control = 'public, no-cache'
+
+    @extend_schema(responses=ReferenceDataSerializer)
+    def get(self, request):
+        bundle = reference_bundle.get()
+        coding = negotiate(request, bundle.encoded) if getattr(settings, 'NEWS_REFERENCE_PRECOMPRESS', True) else None
+        etags = {None: f'"{bundle.etag}"', **{name: f'"{bundle.etag}-{name}"' for name in bundle.encoded}}
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and set(etags.values()) & set(parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        elif coding:
+            response = HttpResponse(bundle.encoded[coding], content_type='application/json')
+            response['Content-Encoding'] = coding
+        else:
+            response = HttpResponse(bundle.body, content_type='application/json')
+        response['ETag'] = etags[coding]
+        response['Cache-Control'] = self.cache_control
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+class MetricsView(APIView):
+    """
+    Per-route latency and query-count histograms from news.instrumentation,
+    in Prometheus text format. Requires ``Authorization: Bearer
+    <NEWS_METRICS_TOKEN>`` when that setting is set, a staff user otherwise.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @staticmethod
+    def metrics_token():
+        return getattr(settings, 'NEWS_METRICS_TOKEN', None)
+
+    def get_authenticators(self):
+        # The scrape token is not a JWT; the user is only needed without one.
+        return [] if self.metrics_token() else super().get_authenticators()
+
+    def get_permissions(self):
+        return [permissions.AllowAny()] if self.metrics_token() else super().get_permissions()
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        token = self.metrics_token()
+        if token and not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def derived_image(request, prefix, digest, width, ext):
+    """
+    Serves a content-addressed image derivative, rendering it on first request
+    if the background pool has not produced it yet.
+    """
+    if ext not in images.derivative_formats() or prefix != digest[:2]:
+        raise Http404
+    path = images.derivative_path(digest, width, ext)
+    if not default_storage.exists(path):
+        news = News.objects.filter(image_hash=digest).only('image', 'image_width').first()
+        if news is None or width not in images.widths_for(news.image_width):
+            raise Http404
+        images.generate_derivative(news.image.name, digest, width, ext)
+    return media.serve(request, path)